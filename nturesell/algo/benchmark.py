@@ -0,0 +1,295 @@
+"""Benchmark of the dispatching algorithms and the simulator
+
+Measures each dispatcher per call and Simulator.run end to end on a
+synthetic day and on days picked from the history data, with fixed seeds,
+and writes the numbers as JSON to compare them between commits.
+
+Usage (in nturesell/):
+    python -m algo.benchmark --output bench.json
+    python -m algo.benchmark --days synthetic --repeat 10 --dispatchers timeline_dispatch
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+from time import perf_counter
+
+import numpy as np
+
+from . import predict_worktime
+from .model import Ship, Task, Tug, ShipState, Side
+from .port import pier_tables, get_pier_latlng, get_pierToPier_dist
+from .settings import CALL_HELP_THR
+from .simulator import Simulator, SimulationState
+from .his.data import get_data, get_company, tug_no_to_hp, hp_to_charge_type
+
+DAYS = ['synthetic', 'least', 'median', 'most']
+PORTS = [9001, 9002]
+
+# tugs with known horsepower in tug_no_to_hp
+TUG_NOS = [143, 145, 151, 152, 153, 155, 112, 241, 245, 321, 322, 101, 302, 104, 106, 108,
+           109, 303, 306, 308, 301, 161, 162, 163, 165, 401, 451, 171, 172, 181, 182]
+
+
+def _cool(tasks, tugs, sys_time):
+    from .greedy.cool import cool_dispatch
+    return cool_dispatch(tasks, tugs, [], False, CALL_HELP_THR, sys_time, verbose=False)
+
+
+def _efficient(tasks, tugs, sys_time):
+    from .greedy.efficient import efficient_dispatch
+    return efficient_dispatch(tasks, tugs, sys_time)
+
+
+def _timeline(tasks, tugs, sys_time):
+    from .greedy.timeline import timeline_dispatch
+    return timeline_dispatch(tasks, tugs, [], False, CALL_HELP_THR, sys_time)
+
+
+def _greedy(tasks, tugs, sys_time):
+    from .greedy.basic import greedy_dispatch
+    return greedy_dispatch(tasks, tugs)
+
+
+# dispatchers called with (tasks, tugs, system time) whatever their signatures
+DISPATCHERS = {
+    'cool_dispatch': _cool,
+    'efficient_dispatch': _efficient,
+    'timeline_dispatch': _timeline,
+    'greedy_dispatch': _greedy,
+}
+
+# dispatchers with the interface of Simulator
+SIMULATED = ['cool_dispatch', 'timeline_dispatch']
+
+
+def _simulated(name):
+    if name == 'cool_dispatch':
+        from .greedy.cool import cool_dispatch
+        return cool_dispatch
+    if name == 'timeline_dispatch':
+        from .greedy.timeline import timeline_dispatch
+        return timeline_dispatch
+    raise ValueError("Invalid dispatcher. Expected one of {}.".format(SIMULATED))
+
+
+def _seed(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def synthetic_day(seed, n_tasks=40, n_tugs=12, day=datetime(2017, 6, 1)):
+    """Random tasks of a day shift and tugs on duty
+
+    Args:
+        seed (int): random seed
+        n_tasks (int): number of tasks between 08:30 and 19:30
+        n_tugs (int): number of tugs, drawn from the tugs in the history data
+
+    Returns:
+        ([Task], [Tug]): tasks sorted by starting time, tugs sorted by type
+    """
+    rnd = random.Random(seed)
+    t = pier_tables()
+    piers = [p for p, (lat, _) in zip(t.ids.tolist(), t.latlng) if lat == lat and p not in PORTS
+             and all(np.isfinite(get_pierToPier_dist(port, p)) for port in PORTS)]
+    shift = day.replace(hour=8, minute=0, second=0, microsecond=0)
+
+    tugs = []
+    for tug_no in rnd.sample(TUG_NOS, min(n_tugs, len(TUG_NOS))):
+        hp = tug_no_to_hp(tug_no)
+        tugs.append(Tug(tug_no, get_pier_latlng(rnd.choice(piers + PORTS)), hp_to_charge_type(hp),
+                        hp, shift, shift + timedelta(minutes=rnd.randint(0, 30))))
+    tugs.sort(key=lambda tug: tug.type)
+
+    tasks = []
+    minutes = sorted(rnd.randint(30, 11*60 + 30) for _ in range(n_tasks))
+    for i, minute in enumerate(minutes):
+        state = rnd.choice(list(ShipState))
+        pier, port = rnd.choice(piers), rnd.choice(PORTS)
+        if state is ShipState.IN:
+            start, dest = port, pier
+        elif state is ShipState.OUT:
+            start, dest = pier, port
+        else:
+            start = pier
+            dest = rnd.choice([p for p in piers if p != pier and
+                               np.isfinite(get_pierToPier_dist(pier, p))])
+        ship = Ship(ship_id=rnd.randint(10000, 99999), cur_pos=get_pier_latlng(start),
+                    weight=rnd.randint(2000, 120000))
+        tasks.append(Task(i=i+1,
+                          ship=ship,
+                          tug_cnt=rnd.choice([1, 2]),
+                          ship_state=state,
+                          start_time=shift + timedelta(minutes=minute),
+                          start=start,
+                          dest=dest,
+                          company=get_company(state.value, start, dest),
+                          side=rnd.choice(list(Side)),
+                          wind_lev=rnd.uniform(0, 6)))
+    return tasks, tugs
+
+
+def history_day(day, seed):
+    """Tasks and tugs of the day picked by Estimator.pick_day
+    """
+    from .estimator import Estimator
+    est = Estimator()
+    est.pick_day(day)
+    _seed(seed)
+    return get_data(est.row_start, est.row_end)
+
+
+def bench_dispatcher(dispatch, tasks, tugs, state, repeat, seed):
+    """Time calls of a dispatcher on all tasks of a day
+
+    The first call starts with an empty prediction cache and is reported as
+    cold, the others reuse the predictions.
+
+    Returns:
+        (dict): seconds of the cold call and statistics of the warm ones
+    """
+    sys_time = min(task.start_time for task in tasks)
+    times = []
+    predict_worktime.cache.clear()
+    for i in range(repeat + 1):
+        state.restore()
+        _seed(seed)
+        start = perf_counter()
+        dispatch(list(tasks), list(tugs), sys_time)
+        times.append(perf_counter() - start)
+
+    warm = times[1:]
+    return {
+        'cold': times[0],
+        'warm': {'min': min(warm), 'median': statistics.median(warm),
+                 'mean': statistics.mean(warm)} if warm else None,
+        'calls': len(times),
+    }
+
+
+def bench_simulator(algo, tasks, tugs, state, seed, memory=True):
+    """Time Simulator.run end to end and measure its peak memory in a second run
+
+    Returns:
+        (dict): seconds, handled events, events per second, dispatch calls,
+            peak memory in MB and the phases of the timed run
+    """
+    predict_worktime.cache.clear()
+    state.restore()
+    _seed(seed)
+    start = perf_counter()
+    result = Simulator(list(tasks), list(tugs), verbose=False).run(algo)
+    seconds = perf_counter() - start
+    events = result['phases'].get('events', {}).get('calls', 0)
+
+    peak = None
+    if memory:
+        predict_worktime.cache.clear()
+        state.restore()
+        _seed(seed)
+        tracemalloc.start()
+        try:
+            Simulator(list(tasks), list(tugs), verbose=False).run(algo)
+            peak = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    state.restore()
+
+    return {
+        'seconds': seconds,
+        'events': events,
+        'events_per_sec': events / seconds if seconds else None,
+        'dispatch_calls': result['sum']['n_calls'],
+        'peak_memory_mb': peak,
+        'phases': result['phases'],
+    }
+
+
+def run_benchmark(days=DAYS, dispatchers=list(DISPATCHERS), simulated=SIMULATED,
+                  repeat=5, seed=0, n_tasks=40, n_tugs=12, memory=True):
+    """Run the benchmark
+
+    Returns:
+        (dict): environment and the measurements of each day
+    """
+    report = {
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'seed': seed,
+        'repeat': repeat,
+        'days': {},
+    }
+    for day in days:
+        try:
+            if day == 'synthetic':
+                tasks, tugs = synthetic_day(seed, n_tasks, n_tugs)
+            else:
+                tasks, tugs = history_day(day, seed)
+        except Exception as e:
+            report['days'][day] = {'error': repr(e)}
+            continue
+
+        state = SimulationState(tasks, tugs)
+        res = {'n_tasks': len(tasks), 'n_tugs': len(tugs), 'dispatchers': {}, 'simulator': {}}
+        for name in dispatchers:
+            try:
+                res['dispatchers'][name] = bench_dispatcher(
+                    DISPATCHERS[name], tasks, tugs, state, repeat, seed)
+            except Exception as e:
+                state.restore()
+                res['dispatchers'][name] = {'error': repr(e)}
+        for name in simulated:
+            try:
+                res['simulator'][name] = bench_simulator(
+                    _simulated(name), tasks, tugs, state, seed, memory)
+            except Exception as e:
+                state.restore()
+                res['simulator'][name] = {'error': repr(e)}
+        report['days'][day] = res
+    return report
+
+
+def _commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                             text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--days', nargs='+', choices=DAYS, default=DAYS)
+    parser.add_argument('--dispatchers', nargs='+', choices=list(DISPATCHERS), default=list(DISPATCHERS))
+    parser.add_argument('--simulate', nargs='*', choices=SIMULATED, default=SIMULATED,
+                        help='dispatchers to run Simulator.run with')
+    parser.add_argument('--repeat', type=int, default=5, help='warm calls of each dispatcher')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tasks', type=int, default=40, help='tasks of the synthetic day')
+    parser.add_argument('--tugs', type=int, default=12, help='tugs of the synthetic day')
+    parser.add_argument('--no-memory', action='store_true', help='skip measuring peak memory')
+    parser.add_argument('--output', help='JSON file to write, stdout if omitted')
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.days, args.dispatchers, args.simulate, args.repeat, args.seed,
+                           args.tasks, args.tugs, not args.no_memory)
+    text = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        sys.stdout.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
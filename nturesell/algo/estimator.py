@@ -1,18 +1,65 @@
-from .simulator import Simulator
+from .simulator import Simulator, SimulationState
+from .profiling import PhaseTimer, profiled, format_phases
 from .model import Company
-from .his.data import get_data, df
-from .utils.plot import ganttplot
+from .his.data import get_data, load_history
+from .utils.plot import ganttplot, gantt_data
 from .utils.utility import count_move_dis, move_dis_to_time, get_pier_latlng, get_oil_price
 from copy import deepcopy
 from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from sys import stderr
 from time import strftime, time
 from scipy import stats
+import logging
 import numpy as np
 import pandas as pd
 import random
 
+logger = logging.getLogger(__name__)
+
+
+# simulation jobs of a worker process and their state, set by _init_worker
+_jobs = None
+_state = None
+
+
+def _init_worker(jobs):
+    global _jobs, _state
+    _jobs = jobs
+    _state = _job_state(jobs)
+
+
+def _job_state(jobs):
+    return SimulationState(*(group for job in jobs for group in job[:3]))
+
+
+def _simulate_round(algo, benchmark, round_seed, verbose=False, jobs=None, state=None):
+    """Run one Monte-Carlo round of an algorithm
+
+    Args:
+        algo (function): the dispatching algorithm
+        benchmark (str): the key of the result to be returned
+        round_seed (int): random seed of the round
+        jobs ([tuple]): (tasks, tugs, help_tugs, subject, key) of each simulator,
+            the jobs given to the worker process if None
+        state (SimulationState): the initial state of the tasks and tugs in jobs
+
+    Returns:
+        ([float]): the benchmark of each job
+    """
+    if jobs is None:
+        jobs, state = _jobs, _state
+    random.seed(round_seed)
+    np.random.seed(round_seed)
+
+    values = []
+    for tasks, tugs, help_tugs, subject, key in jobs:
+        state.restore()
+        sim = Simulator(list(tasks), list(tugs), list(help_tugs), subject, verbose)
+        values.append(sim.run(algo)[key][benchmark])
+    return values
+
+
 class Estimator():
     """A class to estimate the given dispatching algorithm
 
@@ -45,7 +92,7 @@ class Estimator():
         picks = ['most', 'least','median','mean', '30days']
         if day not in picks:
             raise ValueError("Invalid day. Expected one of {}.".format(picks))
-        date = df.start_time.apply(lambda x : x.date())
+        date = load_history().start_time.apply(lambda x : x.date())
         all_dates = np.unique(date)
         date_num = np.array([])
         for i in all_dates:
@@ -75,9 +122,9 @@ class Estimator():
             output = []
             start_days = []
             end_days = []
-            print('Picked dates:')
+            logger.info('Picked dates:')
             for pickday in days:
-                print(pickday)
+                logger.info('%s', pickday)
                 day_idx = [i for i, date in enumerate(date) if date == pickday]
                 if len(day_idx) == 0:
                     days.append(datetime(2017, 1, 1).date() + timedelta(random.randint(1,365) - 1))
@@ -95,19 +142,34 @@ class Estimator():
 
 
 
-    def run(self, algorithm, verbose=False, divided=False):
+    def run(self, algorithm, verbose=False, divided=False, profile=None, trace=None, seed=None,
+            incremental=False):
         """
         Arg:
             algorithm (function): The algorithm as a python function to be estimated
+            profile (str): 'cprofile' or 'pyinstrument' to keep a report of the run in result['profile']
+            trace: a sink with write(record) given to the simulators, see tracing.py
+            seed (int): random seed, the random state is left as it is if None
+            incremental (bool): skip dispatching when nothing it reads changed since the last call
 
         Return:
             result (dict): The result of estimation containing waiting times, tugs, profit, etc
         """
-        
+        if seed is not None:
+            random.seed(seed)
+            np.random.seed(seed)
+        report = {}
+        with profiled(profile, report):
+            results = self._run(algorithm, verbose, divided, trace, incremental)
+        (results[0] if divided else results).update(report)
+        return results
+
+    def _run(self, algorithm, verbose, divided, trace=None, incremental=False):
         t_start = time()
-        self.tasks, self.tugs = get_data(self.row_start, self.row_end)
-        if verbose:
-            print("Simulation with {} tasks".format(len(self.tasks)))
+        loading = PhaseTimer()
+        with loading.phase('load'):
+            self.tasks, self.tugs = get_data(self.row_start, self.row_end)
+        logger.info("Simulation with %d tasks", len(self.tasks))
 
         if divided:
             kh_tugs = [tug for tug in self.tugs if tug.company is Company.KHPORT]
@@ -116,25 +178,29 @@ class Estimator():
             gc_tasks = [task for task in self.tasks if task.company is Company.GANGCHIN]
 
             kh_res = Simulator(kh_tasks, deepcopy(kh_tugs), deepcopy(gc_tugs), \
-                Company.KHPORT, verbose).run(algorithm)
+                Company.KHPORT, verbose, incremental=incremental, trace=trace).run(algorithm)
             gc_res = Simulator(gc_tasks, deepcopy(gc_tugs), deepcopy(kh_tugs), \
-                Company.GANGCHIN, verbose).run(algorithm)
+                Company.GANGCHIN, verbose, incremental=incremental, trace=trace).run(algorithm)
             
             t_end = time()
             kh_res['algorithm'] = algorithm
             kh_res['time_usage'] = t_end - t_start
+            kh_res['phases'].update(loading.as_dict())
             return kh_res, gc_res
             # return kh_res
             
         else:
-            for i in self.tugs:
-                print(i)
-            simulator = Simulator(self.tasks, self.tugs, verbose=verbose)
+            if logger.isEnabledFor(logging.DEBUG):
+                for tug in self.tugs:
+                    logger.debug("%s", tug)
+            simulator = Simulator(self.tasks, self.tugs, verbose=verbose, incremental=incremental,
+                                  trace=trace)
             result = simulator.run(algorithm)
             t_end = time()
 
             result['algorithm'] = algorithm
             result['time_usage'] = t_end - t_start
+            result['phases'].update(loading.as_dict())
 
             return result
 
@@ -171,7 +237,7 @@ class Estimator():
             return sim.result
 
     def multi_run(self, algorithms, n=30, benchmark='profit', divided=True, with_hist=False, \
-        verbose=False, seed=None):
+        verbose=False, seed=None, workers=1):
         """
         Args:
             algorithms ([function]): a list of funcionts to be estimated
@@ -182,6 +248,8 @@ class Estimator():
             with_hist (bool): whether to include comparison with historical result
             verbose (bool): whether to print detailed process of simulation
             seed (int): random seed
+            workers (int): the number of processes to run rounds in parallel,
+                results are the same as running serially
 
         Return:
             pandas.DataFrame: a dict with keys being algorithms' names and values being n times results
@@ -196,6 +264,10 @@ class Estimator():
         if not seed:
             seed = datetime.now().microsecond
 
+        # every algorithm is estimated with the same seed in each round
+        seed_rng = random.Random(seed)
+        round_seeds = [seed_rng.randrange(2**32) for _ in range(n)]
+
         self.tasks, self.tugs = get_data(self.row_start, self.row_end)
         if divided:
             kh_tasks = [task for task in self.tasks if task.company is Company.KHPORT]
@@ -205,38 +277,16 @@ class Estimator():
             
             assert (kh_tugs is not None) or (gc_tugs is not None), 'do not have any tugs of this company'
             
+            jobs = [(kh_tasks, kh_tugs, gc_tugs, Company.KHPORT, 'K'),
+                    (gc_tasks, gc_tugs, kh_tugs, Company.GANGCHIN, 'G')]
             kh_samples = {}
             gc_samples = {}
             times = deque([])
-            for algo in algorithms:
-                print("Estimating {}...".format(algo.__name__), end="")
-                kh_values = []
-                gc_values = []
-                if not verbose:
-                    self._print_progress_init()
-                else:
-                    print("")
-
-                random.seed(seed)
-                t_start = time()
-
-                for i in range(n):
-                    if verbose: print("Round {}/{}...".format(i+1, n))
-
-                    kh_sim = Simulator(deepcopy(kh_tasks), deepcopy(kh_tugs), deepcopy(gc_tugs),
-                        Company.KHPORT, verbose)
-                    kh_values.append(kh_sim.run(algo)['K'][benchmark])
-                    gc_sim = Simulator(deepcopy(gc_tasks), deepcopy(gc_tugs), deepcopy(kh_tugs),
-                        Company.GANGCHIN, verbose)
-                    gc_values.append(gc_sim.run(algo)['G'][benchmark])
-
-                    if not verbose: self._print_progress_done(i, n)
-
-                t_end = time()
-                if not verbose: print('')
-                kh_samples[algo.__name__] = kh_values
-                gc_samples[algo.__name__] = gc_values
-                times.append(t_end-t_start)
+            for algo, values, usage in self._run_rounds(algorithms, jobs, benchmark, 
+                round_seeds, verbose, workers):
+                kh_samples[algo.__name__] = [v[0] for v in values]
+                gc_samples[algo.__name__] = [v[1] for v in values]
+                times.append(usage)
 
             if with_hist:
                 kh_his, gc_his = self.run_hist()
@@ -257,28 +307,13 @@ class Estimator():
                 return kh_samples, gc_samples
 
         else:
+            jobs = [(self.tasks, self.tugs, [], None, 'sum')]
             samples = {}
             times = deque([])
-            for algo in algorithms:
-                print("Estimating {}...".format(algo.__name__), end="")
-                values = []
-                if not verbose: self._print_progress_init()
-                else: print("")
-                random.seed(seed)
-
-                t_start = time()
-                for i in range(n):
-                    if verbose:
-                        print("Round {}/{}...".format(i+1, n))
-                    simulator = Simulator(deepcopy(self.tasks), deepcopy(self.tugs), verbose)
-                    values.append(simulator.run(algo)['sum'][benchmark])
-
-                    if not verbose:
-                        self._print_progress_done(i, n)
-                t_end = time()
-                if not verbose: print('')
-                samples[algo.__name__] = values
-                times.append(t_end-t_start)
+            for algo, values, usage in self._run_rounds(algorithms, jobs, benchmark, 
+                round_seeds, verbose, workers):
+                samples[algo.__name__] = [v[0] for v in values]
+                times.append(usage)
             
             if with_hist:
                 samples['history'] = self.run_hist(divided=False)['sum'][benchmark]
@@ -290,6 +325,47 @@ class Estimator():
             if not with_hist:
                 print(self.compare(samples))
 
+    def _run_rounds(self, algorithms, jobs, benchmark, round_seeds, verbose, workers):
+        """Run the rounds of every algorithm, in a process pool if workers > 1
+
+        Yields:
+            (function, [[float]], float): the algorithm, the benchmarks of jobs
+                in each round and the time usage
+        """
+        n = len(round_seeds)
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(jobs,)) \
+            if workers > 1 else None
+        state = None if pool else _job_state(jobs)
+        try:
+            for algo in algorithms:
+                print("Estimating {}...".format(algo.__name__), end="")
+                if not verbose:
+                    self._print_progress_init()
+                else:
+                    print("")
+
+                t_start = time()
+                if pool:
+                    rounds = pool.map(_simulate_round, [algo]*n, [benchmark]*n, round_seeds, [verbose]*n)
+                else:
+                    rounds = (_simulate_round(algo, benchmark, s, verbose, jobs, state) 
+                        for s in round_seeds)
+
+                values = []
+                for i, value in enumerate(rounds):
+                    if verbose: print("Round {}/{} done".format(i+1, n))
+                    else: self._print_progress_done(i, n)
+                    values.append(value)
+
+                t_end = time()
+                if not verbose: print('')
+                yield algo, values, t_end-t_start
+        finally:
+            if pool:
+                pool.shutdown()
+            else:
+                state.restore()
+
     def _print_multi(self, samples, times=None):
         for algo, result in samples.items():
             print("Algorithm:", algo)
@@ -329,7 +405,7 @@ class Estimator():
             verbose (bool): True to print detail information about tasks, False for summary
         """
         if not result:
-            print("Printing Error: No result", file=stderr)
+            logger.error("Printing Error: No result")
             return
         
         print(("\n"+"="*42+"\n="+"Simulation Result of {}" \
@@ -354,9 +430,64 @@ class Estimator():
 
 
         print("• Time usage: {:.2f} secs".format(result['time_usage']))
-        print("• Time per call: {:.2f} secs\n".format(
+        print("• Time per call: {:.2f} secs".format(
             result['time_usage']/result['sum']['n_calls']))
+        print("• Calls: {}, skipped as unchanged: {}\n".format(
+            result['sum']['n_calls'], result['sum']['n_saved']))
+        if result.get('phases'):
+            print("• Phases (dispatch includes predict):")
+            print("\n".join(format_phases(result['phases'], result['time_usage'])) + "\n")
+        if verbose and result.get('profile'):
+            print(result['profile'])
     
+    def summarize(self, result, gantt=False):
+        """Convert a result of run() to plain types which can be dumped as JSON
+
+        Args:
+            result (dict): Estimation result generated by run()
+            gantt (bool): whether to include the intervals of the Gantt charts
+
+        Returns:
+            (dict): the algorithm, time usage, phases, summary and, if divided,
+                the share of each company; times are in seconds
+        """
+        summary = {
+            'algorithm': result['algorithm'].__name__,
+            'time_usage': result['time_usage'],
+            'phases': result.get('phases', {}),
+            'sum': self._summarize_sum(result['sum']),
+        }
+        if gantt:
+            summary['gantt'] = gantt_data(result['sum']['tasks'], result['sum']['tugs'])
+        for c in Company:
+            if c.value in result:
+                summary[c.value] = {k: v.total_seconds() if isinstance(v, timedelta) else float(v)
+                                    for k, v in result[c.value].items()}
+        return summary
+
+    def _summarize_sum(self, result):
+        summary = {k: float(result[k]) for k in ['revenue', 'waiting_cost', 'moving_cost',
+                                                 'profit', 'matched', 'oversize', 'undersize']}
+        summary['n_calls'] = result['n_calls']
+        summary['n_saved'] = result['n_saved']
+        summary['waiting_time'] = result['waiting_time'].total_seconds()
+        summary['moving_time'] = result['moving_time'].total_seconds()
+        summary['tasks'] = [{
+            'id': task.id,
+            'ship_id': task.ship.ship_id,
+            'ship_state': task.ship_state.name,
+            'state': task.task_state.name,
+            'company': task.company.name,
+            'start_time': task.start_time.isoformat(),
+            'start_time_real': task.start_time_real.isoformat(),
+            'work_time': task.work_time.total_seconds(),
+            'req_types': [t.name for t in task.req_types],
+            'tugs': [tug.tug_id for tug in task.tugs],
+            'revenue': float(task.revenue),
+            'profit': float(task.profit),
+        } for task in sorted(result['tasks'], key=lambda task: task.id)]
+        return summary
+
     def _print_tasks(self, tasks):
         tasks.sort(key=lambda task: task.id)
         for task in tasks:
@@ -448,13 +579,23 @@ class Estimator():
         n = min((done+1)*self.pg_bar//leng, self.pg_bar)
         print('\b'*(self.pg_bar+1)+'█'*n+'-'*(self.pg_bar-n)+'|', end='', flush=True)
 
-    def draw(self, result):
+    def draw(self, result, path='gantt.html'):
+        """
+        Args:
+            result (Dict): Estimation result generated by run().
+            path (str): file of the Gantt charts, .html, .svg or .json
+
+        Return:
+            [str]: paths of the written files
+        """
         if not result:
-            print("Drawing Error: No result", file=stderr)
+            logger.error("Drawing Error: No result")
             return
         if 'sum' in result:
             result = result['sum']
-        ganttplot(result['tasks'], result['tugs'])
+        paths = ganttplot(result['tasks'], result['tugs'], path)
+        logger.info("Gantt charts written to %s", ", ".join(paths))
+        return paths
 
     
     
@@ -1,7 +1,9 @@
 """Define events which calls dispatching algorithm again
 """
 
+import heapq
 from enum import Enum, IntEnum
+from itertools import count
 from datetime import timedelta, datetime
 from typing import List
 from random import random, randint
@@ -257,4 +259,84 @@ class EndWork(Event):
                 )
             tug.state = TugState.FREE
             tug.ts.append(self.time)
-            
\ No newline at end of file
+            
+
+
+class EventQueue:
+    """Priority queue of events ordered by (time, EventOrder)
+
+    Events with the same time and order are popped in insertion order.
+    Moving an event which is already queued (e.g. ConfirmTask and StartWork
+    after a new dispatch) must go through reschedule(), which invalidates
+    the stale heap entry lazily, so that every operation costs O(log n).
+    """
+
+    def __init__(self, events=()):
+        self._heap = []
+        self._entries = {}
+        self._counter = count()
+        for event in events:
+            self.push(event)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, event):
+        return event in self._entries
+
+    def __iter__(self):
+        """Yield the queued events in order without popping them
+        """
+        heap = self._heap
+        if not heap:
+            return
+        frontier = [(heap[0], 0)]
+        while frontier:
+            entry, i = heapq.heappop(frontier)
+            if entry[-1] is not None:
+                yield entry[-1]
+            for child in (2*i+1, 2*i+2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+
+    def push(self, event: Event):
+        """Add an event, replacing its previous entry if it is queued already
+        """
+        self._invalidate(event)
+        entry = [event.time, event.order, next(self._counter), event]
+        self._entries[event] = entry
+        heapq.heappush(self._heap, entry)
+
+        # drop stale entries once they outnumber the live ones
+        if len(self._heap) > 2 * len(self._entries) + 32:
+            self._heap = [e for e in self._heap if e[-1] is not None]
+            heapq.heapify(self._heap)
+
+    def reschedule(self, event: Event):
+        """Update the position of a queued event whose time has been modified
+
+        Events which are not in the queue (e.g. handled ones) are ignored.
+        """
+        entry = self._entries.get(event)
+        if entry is not None and (entry[0] != event.time or entry[1] != event.order):
+            self.push(event)
+
+    def remove(self, event: Event):
+        if self._invalidate(event) is None:
+            raise ValueError("Event is not in the queue")
+
+    def pop(self) -> Event:
+        """Remove and return the earliest event
+        """
+        while self._heap:
+            event = heapq.heappop(self._heap)[-1]
+            if event is not None:
+                del self._entries[event]
+                return event
+        raise IndexError("pop from an empty event queue")
+
+    def _invalidate(self, event):
+        entry = self._entries.pop(event, None)
+        if entry is not None:
+            entry[-1] = None
+        return entry
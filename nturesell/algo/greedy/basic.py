@@ -1,20 +1,22 @@
 """greedy dispatch v1
 """
 import copy
-from sys import stderr
+import logging
 from algo.model import TaskState, ShipState, ChargeTypeList
 from .helper import find_possible_set, tug_to_charge_type, \
     get_pier_latlng, max_arrival_time, count_profit
-from algo.predict_worktime import predict_worktime
+from algo.predict_worktime import predict_batch
 from datetime import timedelta
 
+logger = logging.getLogger(__name__)
+
 
 def find_best_set(tug_set, task):
     max_profit = 0
     work_time = 0
     best_set = []
-    for tugs in tug_set:
-        wt = predict_worktime(task, tugs)
+    work_times = predict_batch([task] * len(tug_set), tug_set)
+    for tugs, wt in zip(tug_set, work_times):
         arv_time = max_arrival_time(task, tugs)
         result = count_profit(task, tugs, wt, arv_time)
         if result['total_profit'] > max_profit:
@@ -44,11 +46,10 @@ def greedy_dispatch(tasks, tugs):
     tasks = tmp
     tasks.sort(key=lambda x: x.start_time)
     #tugs = copy.deepcopy(tugs)
-    stderr.write(
-        "Dispatching {} tasks with Simple Greedy...\n".format(len(tasks)))
+    logger.debug("Dispatching %d tasks with Simple Greedy...", len(tasks))
 
     for task in tasks:
-        stderr.write("Dispathching task {} ...\n".format(task.id))
+        logger.debug("Dispathching task %s ...", task.id)
 
         # required_tug_list (type):[收費型號] ex: [117,118]
         required_tugs_list = task.req_types
@@ -75,7 +76,7 @@ def greedy_dispatch(tasks, tugs):
         max_profit = result['max_profit']
 
         if not best_set:
-            stderr.write("No best set!\n")
+            logger.info("No best set for task %s!", task.id)
             continue
 
         # 更改每個tasks（複製的tasks）的
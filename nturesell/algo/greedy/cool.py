@@ -1,7 +1,7 @@
 """Cool dispatch, a dispatching algorithm example
 """
 
-from sys import stderr
+import logging
 from datetime import timedelta, datetime
 from typing import List
 from collections import deque
@@ -10,6 +10,8 @@ from ..settings import PENALTY, WAITING_TIME
 from ..utils.utility import count_move_time, get_oil_price, count_move_dis, get_pier_latlng
 from ..predict_worktime import predict_worktime
 
+logger = logging.getLogger(__name__)
+
 
 class CoolTug():
 
@@ -51,7 +53,7 @@ def cool_dispatch(tasks, tugs, helped_tugs, call_help, call_help_thr, \
 
     for task in tasks:
         if verbose:
-            print("Dispathching task {} ...".format(task.id))
+            logger.debug("Dispathching task %s ...", task.id)
 
         # Find require charge type and remove unqualified tugs from available tug set
         required_tugs_list = task.req_types
@@ -120,7 +122,7 @@ def cool_dispatch(tasks, tugs, helped_tugs, call_help, call_help_thr, \
          
         if len(best_set) != len(required_tugs_list):
             if verbose:
-                print("Task", task.id, "No good choices!")
+                logger.debug("Task %s No good choices!", task.id)
             res.append([])
             times.append(task.start_time)
             continue
@@ -152,7 +154,7 @@ def cool_dispatch(tasks, tugs, helped_tugs, call_help, call_help_thr, \
             tug.next_available_time = start_time_real + work_time
             tug.pos = get_pier_latlng(task.to)
         if verbose:
-            print("> Tugs:", [tug.tug_id for tug in choices], start_time_real.strftime("%H:%M"))
+            logger.debug("> Tugs: %s %s", [tug.tug_id for tug in choices], start_time_real.strftime("%H:%M"))
 
     return res, times
 
@@ -1,14 +1,17 @@
-from sys import stderr
-from datetime import timedelta
+import logging
+from datetime import datetime, timedelta
 from ..greedy.helper import tug_to_charge_type
 from ..greedy.helper import max_arrival_time, count_profit
 from ..model import TaskState, TugState, ShipState, ChargeTypeList, Tug, Task
 from ..settings import PENALTY, WAITING_TIME, SYSTEM_TIME
 from ..port import get_pier_latlng
-from ..predict_worktime import predict_worktime
+from ..predict_worktime import predict_worktime, predict_batch
 from ..utils.utility import count_move_time
+from .tug_timeline import TugTimeline, merged_gaps
 import copy
-from itertools import combinations
+from itertools import accumulate, combinations
+
+logger = logging.getLogger(__name__)
 
 class GTug():
 
@@ -17,13 +20,17 @@ class GTug():
         self.id = tug.tug_id
         self.next_available_time = tug.next_available_time
         self.pos = tug.pos
-        self.jobs = []
+        self.timeline = TugTimeline()
         self.state = tug.state
         self.ts = tug.ts
         self.tasks = tug.tasks 
         self.company = tug.company
         
 
+    @property
+    def jobs(self):
+        return self.timeline.jobs
+
     @property
     def type(self):
         return self.tug.type
@@ -37,8 +44,8 @@ class GTug():
         return self.tug.tug_id
 
 
-def candSet(tsk, tgs, match):
-    # 產生所有的候選組合
+def candTugs(tsk, tgs, match):
+    # 可組成候選組合的拖船
     requires = tsk.req_types
     cands = []
     if match == 'over':
@@ -52,139 +59,202 @@ def candSet(tsk, tgs, match):
         for tg in tgs:
             cands.append(tg)
 
-    cands_comb = combinations(cands, len(requires))   
+    return cands
+
+def candSet(tsk, tgs, match):
+    # 產生所有的候選組合
+    cands_comb = combinations(candTugs(tsk, tgs, match), len(tsk.req_types))   
 
     return cands_comb
 
-def elongate(tsk, tg_set):
-    # for each tug in tg_set, for each of its job, elongate its starting and ending times 
-    # according to its location and the new job tsk's location
-    original_lst = []
-    
-    if len(tg_set) == 1:
-        for i in range(len(tg_set[0].jobs)):
-            s = tg_set[0].jobs[i][0] - count_move_time(get_pier_latlng(tsk.to), tg_set[0].jobs[i][2])
-            e = tg_set[0].jobs[i][1] + count_move_time(get_pier_latlng(tg_set[0].jobs[i][3]), tsk.start)
-            original_lst.append([s,e])
-    else:    
-        for i in tg_set:
-            original_lst.append([]) 
-        for i in range(len(tg_set)):
-            for j in range(len(tg_set[i].jobs)):
-                original_lst[i].append(tg_set[i].jobs[j][0] - count_move_time(get_pier_latlng(tsk.to), tg_set[i].jobs[j][2]))
-                original_lst[i].append(tg_set[i].jobs[j][1] + count_move_time(get_pier_latlng(tg_set[i].jobs[j][3]), tsk.start))
-
-    return original_lst
-
-def mergeTimeline(tsk, tg_set):
-    elong_lst = elongate(tsk, tg_set)
-    final_lst = []
-    for tg_times in elong_lst:
-        for i in range(len(tg_times) // 2):
-            final_lst.append([tg_times[2 * i], tg_times[2 * i + 1]])
-
-    final_lst.sort(key=lambda x: x[0])
-    if len(final_lst)==0:
-        merged = []
-    else:
-        merged = [final_lst[0]]
-    for current in final_lst:
-        previous = merged[-1]
-        if current[0] <= previous[1]:
-            previous[1] = max(previous[1], current[1])
-        else:
-            merged.append(current)
+def prepare_delay(tsk, tg_set, next_available_time=None, mt_TugtoTask=None):
+    # the timeline of a tug set and the earliest time the tugs can arrive
+    if next_available_time is None:
+        next_available_time = max([tg.next_available_time for tg in tg_set])
+    if len(tg_set)==1: # for one tug set, only elongate timeline
+        merged = tg_set[0].timeline.gaps(tsk.start, tsk.to)
+    else: # for two or three tug set, merge elongated timeline
+        merged = merged_gaps([tg.timeline for tg in tg_set], tsk.start, tsk.to)
+    if mt_TugtoTask is None:
+        mt_TugtoTask = max([count_move_time(tg.pos, tsk.start) for tg in tg_set])
+    return merged, next_available_time, mt_TugtoTask
 
-    return merged
 
+def first_start(merged, s_time, available):
+    # the first interval whose previous one, or the arrival of the tugs, ends before the task starts
+    if s_time > available:
+        return 0
+    i = merged.first_end_before(s_time) + 1
+    return i if i < len(merged) else None
 
-def cal_delay(tsk, tg_set):
-    work_time = predict_worktime(tsk, tg_set)
-    next_available_time = max([tg.next_available_time for tg in tg_set])
-    if len(tg_set)==1: # for one tug set, only elongate timeline
-        merged = elongate(tsk, tg_set)
-    else: # for two or three tug set, merge elongated timeline
-        merged = mergeTimeline(tsk, tg_set) 
+
+def cal_delay(tsk, tg_set, work_time=None, prepared=None):
+    if work_time is None:
+        work_time = predict_worktime(tsk, tg_set)
+    if prepared is None:
+        prepared = prepare_delay(tsk, tg_set)
+    merged, next_available_time, mt_TugtoTask = prepared
 
     # merged 存的是合併後的已加上移動時間的工作時間軸e.g.[[2, 6], [12, 18], [25, 30]]兩兩一組
     s_time = tsk.start_time
     e_time = tsk.start_time+work_time
-    mt_TugtoTask = max([count_move_time(tg.pos, tsk.start) for tg in tg_set])
 
-    delaytime = timedelta(0)
     if len(merged) == 0:
         delaytime = next_available_time + mt_TugtoTask - s_time
         if delaytime < timedelta(0):
             delaytime = timedelta(0)
         return delaytime
 
-    else:
-        for i in range(len(merged)):
-            if i == 0:
-                prev = next_available_time + mt_TugtoTask
-            else:
-                prev = merged[i-1][1]
+    i = first_start(merged, s_time, next_available_time + mt_TugtoTask)
+    if i is None:
+        #需處理如果開始時間在拖船可用時間之前
+        return timedelta(minutes=999999)
+    if e_time < merged.starts[i]: # can insert
+        return timedelta(0)
 
-            if s_time > prev:
+    # a later interval the task could be inserted before would leave a gap
+    # of more than work_time, so the first such gap is the answer
+    j = merged.first_gap(i+1, work_time)
+    if j < len(merged): # can delay insert
+        return merged.ends[j-1] - s_time
 
-                if e_time < merged[i][0]: # can insert
-                    delaytime = timedelta(0)
-                    return delaytime
-                else:
-                    for j in range(i+1, len(merged)):
-                        if work_time <= (merged[j][0] - merged[j-1][1]): # can delay insert
-                            delaytime = merged[j-1][1] - s_time
-                            return delaytime
+    # the delay of the last interval
+    last = next_available_time + mt_TugtoTask if len(merged) == 1 else merged.ends[-2]
+    if s_time > last:
+        return merged.ends[-1] - s_time
+    return timedelta(minutes=999999)
 
-                    delaytime = merged[len(merged)-1][1] - s_time
-            else:
-                #需處理如果開始時間在拖船可用時間之前
-                delaytime = timedelta(minutes=999999)
 
-    return delaytime
+def bound_delay(tsk, prepared):
+    """Bound the delay cal_delay gives for any working time
 
+    Args:
+        tsk (Task): the task to be inserted
+        prepared (tuple): the timeline of a tug set given by prepare_delay
 
-def insertjob(nt, tg, jobs):
-    # update jobs list of tug
-    mt_f = timedelta(0)
-    mt_b = timedelta(0)
-    
-    if len(jobs)==0:
-        jobs.insert(0, nt)
-        return jobs, True
-    else:
-        for i in range(len(jobs)):
-            if i==0:
-                prev = tg.next_available_time
-                mt_f = count_move_time(tg.pos, nt[2])
-                mt_b = count_move_time(get_pier_latlng(nt[3]), jobs[i][2])
-                nt[0] = nt[0] - mt_f
-                nt[1] = nt[1] + mt_b
-            else:
-                prev = jobs[i-1][1]
-                mt_f = count_move_time(get_pier_latlng(jobs[i-1][3]), nt[2]) 
-                mt_b = count_move_time(get_pier_latlng(nt[3]), jobs[i][2])
-                nt[0] = nt[0] - mt_f
-                nt[1] = nt[1] + mt_b
-            
-            if nt[1] <= jobs[i][0] and nt[0] >= prev: 
-                nt[0] = nt[0] + mt_f
-                nt[1] = nt[1] - mt_b
-                jobs.insert(i, nt)
-                return jobs, True
+    Returns:
+        (timedelta): the delay if it does not depend on the working time, or None
+        (timedelta): a lower bound of the delay
+        (bool): whether the delay can be zero
+    """
+    merged, next_available_time, mt_TugtoTask = prepared
+    s_time = tsk.start_time
+    available = next_available_time + mt_TugtoTask
+    if len(merged) == 0:
+        delaytime = max(available - s_time, timedelta(0))
+        return delaytime, delaytime, delaytime == timedelta(0)
+
+    i = first_start(merged, s_time, available)
+    if i is None: # the task starts before the tugs are available
+        delaytime = timedelta(minutes=999999)
+        return delaytime, delaytime, False
+
+    zero = available < s_time < merged.starts[0] or merged.free_at(s_time) or merged.ends_at(s_time)
+    lower = min(merged.min_end(i) - s_time, timedelta(minutes=999999))
+    if zero:
+        lower = min(lower, timedelta(0))
+    return None, lower, zero
+
+
+def best_candidate(tsk, tugs, size):
+    """Find the set of size tugs which has no delay first or else the least
+    delay first, as checking cal_delay of every combination in order does.
+
+    Sets are built a tug at a time in the order of combinations and a set is
+    not extended once no set containing it can be as good as the best delay
+    known. Adding tugs only makes them arrive later and adds jobs, and a delay
+    of at most d needs the tugs to arrive or a job to end by d after the task
+    starts. A set of the same busy tugs, horsepower and side of the starting
+    time to arrive as an earlier set has the same delay and is skipped. The
+    working time is only predicted for sets whose delay depends on it and may
+    be the best.
 
-            else:
-                nt[0] = nt[0] + mt_f
-                nt[1] = nt[1] - mt_b
-                
-        mt_f = count_move_time(get_pier_latlng(jobs[len(jobs)-1][3]), nt[2])
+    Args:
+        tsk (Task): the task to be dispatched
+        tugs ([GTug]): candidate tugs
+        size (int): the number of tugs in a set
 
-        if nt[0]-mt_f >= jobs[len(jobs)-1][1]:
-            jobs.append(nt)
-            return jobs, True
+    Returns:
+        ([GTug]): the best tug set, None if there is no candidate
+        (timedelta): its delay
+    """
+    s_time = tsk.start_time
+    never = timedelta(minutes=999999)
+    far = s_time + never
+    moves = [count_move_time(tg.pos, tsk.start) for tg in tugs]
+    # the earliest end of the jobs of each tug and of the tugs from it on,
+    # no later than the ends of the jobs padded by moving times
+    ends = [min(job[1] for job in tg.jobs) if tg.jobs else far for tg in tugs]
+    ends_from = list(accumulate(reversed(ends), min))[::-1] + [far]
+
+    cands = []
+    prepared = []
+    bounds = []
+    seen = set()
+    upper = None
+
+    def extend(k, chosen, busy, hp, next_available, move, end):
+        # add each tug from k on to chosen, True once a set has no delay for sure
+        nonlocal upper
+        last = len(chosen) + 1 == size
+        for i in range(k, len(tugs) - size + len(chosen) + 1):
+            tg = tugs[i]
+            available = max(next_available, tg.next_available_time)
+            mt = max(move, moves[i])
+            first_end = min(end, ends[i])
+            if upper is not None:
+                # the earliest time a set containing it can arrive or end a job,
+                # against the least delay known which is never negative
+                soon = min(available + mt, first_end, far if last else ends_from[i+1])
+                if min(soon - s_time, never) > upper:
+                    continue
 
+            cand = chosen + [tg]
+            cand_busy = busy + (tg.id,) if tg.jobs else busy
+            if not last:
+                if extend(i+1, cand, cand_busy, hp + tg.hp, available, mt, first_end):
+                    return True
+                continue
 
-    return jobs, False
+            if cand_busy:
+                key = (cand_busy, hp + tg.hp, s_time > available + mt)
+                if key in seen:
+                    continue
+                seen.add(key)
+            cands.append(cand)
+            prepared.append(prepare_delay(tsk, cand, available, mt))
+            bounds.append(bound_delay(tsk, prepared[-1]))
+            delay = bounds[-1][0]
+            if delay is not None and (upper is None or delay < upper):
+                upper = delay
+            if delay == timedelta(0): # the search always stops here
+                return True
+        return False
+
+    extend(0, [], (), 0, datetime.min, timedelta(0), far)
+
+    todo = [i for i, (delay, lower, zero) in enumerate(bounds) 
+            if delay is None and (zero or upper is None or lower <= upper)]
+    work_times = dict(zip(todo, predict_batch([tsk] * len(todo), [cands[i] for i in todo])))
+
+    delayList = []
+    for i, (delay, _, _) in enumerate(bounds):
+        if i in work_times:
+            delay = cal_delay(tsk, cands[i], work_times[i], prepared[i])
+        elif delay is None: # bounded to be worse than another set
+            continue
+        if delay == timedelta(0):
+            return cands[i], delay
+        delayList.append([cands[i], delay])
+
+    if delayList:
+        return min(delayList, key = lambda x: x[1])
+    return None, timedelta(0)
+
+
+def insertjob(nt, tg):
+    # update jobs list of tug
+    return tg.timeline.insert(nt, tg.next_available_time, tg.pos)
 
 
 def timeline_dispatch(tsks, tgs, help_tug, help, thredhold, systime):
@@ -205,7 +275,7 @@ def timeline_dispatch(tsks, tgs, help_tug, help, thredhold, systime):
     tasks_order = copy.deepcopy(tsks)
     tasks_order.sort(key = lambda x: x.start_time)
 
-    stderr.write("Dispatching {} tasks with Gogo ...\n".format(len(tasks)))
+    logger.debug("Dispatching %d tasks with Gogo ...", len(tasks))
     
     '''-----task 分類-----'''
     tasks_priority = []
@@ -221,7 +291,7 @@ def timeline_dispatch(tsks, tgs, help_tug, help, thredhold, systime):
 
     '''--------處理 Temp Need---------'''
     for task in tasks_tempNeed:
-        stderr.write("Dispatching task {} \n".format(task.id))
+        logger.debug("Dispatching task %s", task.id)
         best_set = []
         startList = []
         for tug in tugs:
@@ -270,12 +340,12 @@ def timeline_dispatch(tsks, tgs, help_tug, help, thredhold, systime):
         nt = [task.start_time, task.start_time + work_time, task.start, task.to]
         check = False
         for tug in best_set:
-            tug.jobs, check = insertjob(nt, tug, tug.jobs)
+            check = insertjob(nt, tug)
             # if check==True:
                 # print('good insert',tug.id)
             for i in range(len(tugs)):
                 if tugs[i].id == tug.id:
-                    tugs[i].jobs = tug.jobs
+                    tugs[i].timeline = tug.timeline
             tug.next_available_time = task.available_start + work_time 
             # print('tug_next', tug.next_available_time)
             tug.pos = get_pier_latlng(task.to)
@@ -292,45 +362,22 @@ def timeline_dispatch(tsks, tgs, help_tug, help, thredhold, systime):
 
     '''--------處理拖船需求二以上---------'''
     for task in tasks_priority:
-        stderr.write("Dispatching task {} \n".format(task.id))
+        logger.debug("Dispatching task %s", task.id)
         best_set = []
-        delayList = []
-        cands = candSet(task, tugs, 'over')
         opt_delay_time = timedelta(0)
-        for cand in list(cands):
-            delaytime = cal_delay(task, list(cand))
-            
-            if delaytime == timedelta(0):
-                best_set.extend(list(cand))
-                opt_delay_time = delaytime
-                break
-            delayList.append([list(cand), delaytime])
-        
-        if len(delayList)!=0 and len(best_set)==0:
-            opt = min(delayList, key = lambda x: x[1])
-            best_set.extend(opt[0])
-            opt_delay_time = opt[1]
+        best, delaytime = best_candidate(task, candTugs(task, tugs, 'over'), len(task.req_types))
+        if best is not None:
+            best_set.extend(best)
+            opt_delay_time = delaytime
         
 
         # 往上沒有符合型號的拖船，傳入的拖船型號沒有最高型號'type 0'
         if len(best_set) == 0:
             # 往下派拖船型號
-            delayList = []
-            cands = candSet(task, tugs, 'every')
-            for cand in list(cands):
-                delaytime = cal_delay(task, list(cand))
-                
-                if delaytime == timedelta(0):
-                    best_set.extend(list(cand))
-                    opt_delay_time = delaytime
-                    break
-                delayList.append([list(cand), delaytime])
-            
-            if len(delayList)!=0 and len(best_set)==0:
-                opt = min(delayList, key = lambda x: x[1])
-                best_set.append(opt[0])
-                opt_delay_time = opt[1]
-            #
+            best, delaytime = best_candidate(task, candTugs(task, tugs, 'every'), len(task.req_types))
+            if best is not None:
+                best_set.extend(best)
+                opt_delay_time = delaytime
 
         # update jobs list of best set
         
@@ -339,14 +386,14 @@ def timeline_dispatch(tsks, tgs, help_tug, help, thredhold, systime):
         nt = [task.start_time, task.start_time + predict_worktime(task, best_set), task.start, task.to]
         check = False
         for tug in best_set:
-            tug.jobs, check = insertjob(nt, tug, tug.jobs)
+            check = insertjob(nt, tug)
             # if check==True:
                 # print('good insert',tug.id)
             # else:
                 # print('!!!!!error insert')
             for i in range(len(tugs)):
                 if tugs[i].id == tug.id:
-                    tugs[i].jobs = tug.jobs
+                    tugs[i].timeline = tug.timeline
                     
 
         if check==True:
@@ -358,44 +405,23 @@ def timeline_dispatch(tsks, tgs, help_tug, help, thredhold, systime):
         
     '''----------處理拖船需求1---------'''
     for task in tasks_ones:
-        stderr.write("Dispatching task {} \n".format(task.id))
+        logger.debug("Dispatching task %s", task.id)
         best_set = []
-        delayList = []
         opt_delay_time = timedelta(0)
-        for tug in tugs:
-            # find tug with smallest delay
-            if tug.type >= task.req_types[0]:
-                delaytime = cal_delay(task, [tug])
-                
-                if delaytime == timedelta(0):
-                    best_set.append(tug)
-                    opt_delay_time = delaytime
-                    break
-                delayList.append([tug, delaytime])
-        
-        if len(delayList)!=0 and len(best_set)==0:
-            opt = min(delayList, key = lambda x: x[1])
-            best_set.append(opt[0])
-            opt_delay_time = opt[1]
+        # find tug with smallest delay
+        best, delaytime = best_candidate(task, [tug for tug in tugs if tug.type >= task.req_types[0]], 1)
+        if best is not None:
+            best_set.extend(best)
+            opt_delay_time = delaytime
         
 
         # 往上沒有符合型號的拖船，傳入的拖船型號沒有最高型號'type 0'
         if len(best_set)==0:
             # 往下派拖船型號
-            delayList = []
-            for tug in tugs:
-                if tug.type < task.req_types[0]:
-                    delaytime = cal_delay(task, [tug])
-                    if delaytime == timedelta(0):
-                        best_set.append(tug)
-                        opt_delay_time = delaytime
-                        break
-                    delayList.append([tug, delaytime])
-
-            if len(delayList)!=0 and len(best_set)==0:
-                opt = min(delayList, key = lambda x: x[1])
-                best_set.append(opt[0])
-                opt_delay_time = opt[1]
+            best, delaytime = best_candidate(task, [tug for tug in tugs if tug.type < task.req_types[0]], 1)
+            if best is not None:
+                best_set.extend(best)
+                opt_delay_time = delaytime
 
         
         # update jobs list of best set
@@ -405,14 +431,14 @@ def timeline_dispatch(tsks, tgs, help_tug, help, thredhold, systime):
         nt = [task.start_time, task.start_time + predict_worktime(task, best_set), task.start, task.to]
         check = False
         for tug in best_set:
-            tug.jobs, check = insertjob(nt, tug, tug.jobs)
+            check = insertjob(nt, tug)
             # if check==True:
                 # print('good insert',tug.id)
             # else: 
                 # print('!!!!!error insert')
             for i in range(len(tugs)):
                 if tugs[i].id == tug.id:
-                    tugs[i].jobs = tug.jobs
+                    tugs[i].timeline = tug.timeline
 
         if check==True:
             for t in tasks:
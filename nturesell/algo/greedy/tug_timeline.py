@@ -0,0 +1,221 @@
+"""Sorted job timelines of tugs shared by the timeline dispatchers
+"""
+
+from bisect import bisect_left
+from heapq import merge
+from itertools import accumulate
+from ..port import get_pier_latlng
+from ..utils.utility import count_move_time
+
+
+class IntervalIndex():
+    """Intervals with the arrays to find where a task fits between them in
+    logarithmic time
+
+    The intervals are kept in the given order, which may leave them
+    overlapping, as the padded jobs of a tug do.
+
+    Attributes:
+        starts ([datetime]): starting times of the intervals
+        ends ([datetime]): ending times of the intervals
+    """
+
+    def __init__(self, intervals):
+        self.starts = [s for s, _ in intervals]
+        self.ends = [e for _, e in intervals]
+        # least end up to and from each interval
+        self._min_ends = list(accumulate(self.ends, min))
+        self._min_ends_after = list(accumulate(reversed(self.ends), min))[::-1]
+        self._sorted_ends = sorted(self.ends)
+
+        # free spans between consecutive intervals by where they begin, with the latest end so far
+        free = sorted((e, s) for e, s in zip(self.ends, self.starts[1:]) if e < s)
+        self._free_begins = [e for e, _ in free]
+        self._free_ends = list(accumulate((s for _, s in free), max))
+
+        # tree of the largest gaps, the gap before interval j+1 is leaf j
+        gaps = [s - e for s, e in zip(self.starts[1:], self.ends)]
+        size = 1
+        while size < len(gaps):
+            size *= 2
+        # the leaves after the gaps are never searched into
+        tree = [None] * size + gaps + gaps[:1] * (size - len(gaps))
+        for i in range(size - 1, 0, -1):
+            tree[i] = max(tree[2*i], tree[2*i+1])
+        self._size = size
+        self._max_gaps = tree
+
+    def __len__(self):
+        return len(self.starts)
+
+    def first_end_before(self, t):
+        """Index of the first interval ending before t, or the number of intervals
+        """
+        lo, hi = 0, len(self.ends)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._min_ends[mid] < t:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def first_gap(self, i, length):
+        """Index j >= i of the first interval starting at least length after
+        interval j-1 ends, or the number of intervals
+        """
+        n = len(self.starts)
+        i = max(i, 1)
+        if i >= n:
+            return n
+        tree = self._max_gaps
+        k = self._size + i - 1
+        while not tree[k] >= length:
+            # climb to the next subtree on the right
+            while k & 1:
+                k >>= 1
+            if k == 0:
+                return n
+            k += 1
+        while k < self._size:
+            k = 2 * k if tree[2*k] >= length else 2 * k + 1
+        return min(k - self._size + 1, n)
+
+    def min_end(self, i):
+        """The least end of the intervals from index i on
+        """
+        return self._min_ends_after[i]
+
+    def ends_at(self, t):
+        """Whether an interval ends at t
+        """
+        k = bisect_left(self._sorted_ends, t)
+        return k < len(self._sorted_ends) and self._sorted_ends[k] == t
+
+    def free_at(self, t):
+        """Whether t is strictly between the end of an interval and the start of the next one
+        """
+        k = bisect_left(self._free_begins, t)
+        return k > 0 and self._free_ends[k-1] > t
+
+
+class TugTimeline():
+    """Jobs of a tug sorted by starting time, with the boundaries padded by
+    moving times to and from a task cached until the next insertion
+
+    Attributes:
+        jobs ([list]): [start time, end time, from pier, to pier] of each job
+        starts ([datetime]): starting times of the jobs, for binary search
+    """
+
+    def __init__(self):
+        self.jobs = []
+        self.starts = []
+        self._padded = {}
+        self._gaps = {}
+        self._merged = {}
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def padded(self, start, to):
+        """Jobs elongated by moving from the pier to, where a task ends, to each job
+        and from each job to the pier start, where the task begins
+
+        Returns:
+            ([(datetime, datetime)]): elongated jobs in the order of jobs
+        """
+        key = (start, to)
+        if key not in self._padded:
+            dest = get_pier_latlng(to)
+            self._padded[key] = [(job[0] - count_move_time(dest, job[2]),
+                                  job[1] + count_move_time(get_pier_latlng(job[3]), start))
+                                 for job in self.jobs]
+        return self._padded[key]
+
+    def gaps(self, start, to):
+        """IntervalIndex of the padded jobs in the order of jobs
+        """
+        key = (start, to)
+        if key not in self._gaps:
+            self._gaps[key] = IntervalIndex(self.padded(start, to))
+        return self._gaps[key]
+
+    def merged(self, start, to):
+        """Padded jobs merged into sorted disjoint intervals
+
+        Returns:
+            ([(datetime, datetime)]): the intervals sorted by starting time
+        """
+        key = (start, to)
+        if key not in self._merged:
+            self._merged[key] = merge_intervals(sorted(self.padded(start, to)))
+        return self._merged[key]
+
+    def insert(self, nt, next_available_time, pos):
+        """Insert a job into the first slot it fits with moving times, as insertjob
+        of greedy/timeline3.py did by scanning every slot
+
+        Args:
+            nt (list): [start time, end time, from pier, to pier] of the job
+            next_available_time (datetime): when the tug finishes its current task
+            pos ((float, float)): where the tug is
+
+        Returns:
+            (bool): whether the job is inserted
+        """
+        jobs = self.jobs
+        if not jobs:
+            self._insert(0, nt)
+            return True
+
+        # a slot before jobs[i] needs jobs[i] to start after nt ends, and
+        # the slots after one ending later than nt starts can not fit
+        for i in range(bisect_left(self.starts, nt[1]), len(jobs)):
+            if i == 0:
+                prev = next_available_time
+                mt_f = count_move_time(pos, nt[2])
+            else:
+                prev = jobs[i-1][1]
+                if prev > nt[0]:
+                    return False
+                mt_f = count_move_time(get_pier_latlng(jobs[i-1][3]), nt[2])
+            mt_b = count_move_time(get_pier_latlng(nt[3]), jobs[i][2])
+            if nt[1] + mt_b <= jobs[i][0] and nt[0] - mt_f >= prev:
+                self._insert(i, nt)
+                return True
+
+        mt_f = count_move_time(get_pier_latlng(jobs[-1][3]), nt[2])
+        if nt[0] - mt_f >= jobs[-1][1]:
+            self._insert(len(jobs), nt)
+            return True
+        return False
+
+    def _insert(self, i, nt):
+        self.jobs.insert(i, nt)
+        self.starts.insert(i, nt[0])
+        self._padded.clear()
+        self._gaps.clear()
+        self._merged.clear()
+
+
+def merge_intervals(intervals):
+    """Merge intervals sorted by starting time, touching ones included
+
+    Returns:
+        ([(datetime, datetime)]): sorted disjoint intervals
+    """
+    merged = []
+    for s, e in intervals:
+        if merged and s <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], e)
+        else:
+            merged.append([s, e])
+    return [tuple(interval) for interval in merged]
+
+
+def merged_gaps(timelines, start, to):
+    """IntervalIndex of the padded jobs of several tugs merged into sorted
+    disjoint intervals, from the merged intervals each timeline caches
+    """
+    return IntervalIndex(merge_intervals(merge(*[tl.merged(start, to) for tl in timelines])))
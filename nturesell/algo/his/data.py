@@ -1,21 +1,41 @@
 """Process history data"""
 
 import os
+import logging
 import pandas as pd
 import numpy as np
-from sys import stderr
 from datetime import timedelta, datetime
+from functools import lru_cache
 from random import random, sample
 from ..model import Ship, Task, Side, ShipState, TaskState, Tug, ChargeType, TaskPriority, Company
 from ..utils.utility import get_pier_latlng
 from ..settings import SYSTEM_TIME, TUG_STARTING_PLACE, N_TUGS
 from ..port import get_closest_pier
 
+logger = logging.getLogger(__name__)
+
 
 DIR = os.path.dirname(__file__)
 FILE = os.path.join(DIR, "2017.pkl")
-print("Reading {}\n".format(FILE))
-df = pd.DataFrame(pd.read_pickle(FILE))
+
+
+@lru_cache(maxsize=None)
+def load_history():
+    """Read the history data on first use
+
+    Returns:
+        (pandas.DataFrame): tasks of 2017
+    """
+    df = pd.DataFrame(pd.read_pickle(FILE))
+    logger.debug("Loaded %d tasks of history from %s", len(df), FILE)
+    return df
+
+
+def __getattr__(name):
+    # the module attribute df is loaded lazily
+    if name == "df":
+        return load_history()
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
 
 
 def tug_no_to_hp(tug_no):
@@ -81,19 +101,57 @@ def find_state(v):
     return res[0] if len(res) > 0 else None
 
 
+class TugIndex():
+    """Rows of history data where each tug worked, to look up the last
+    assignment of a tug before a row by binary search
+
+    Args:
+        df (pandas.DataFrame): history data
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.rows = {}
+        for col in (df.tug1_no.to_numpy(), df.tug2_no.to_numpy(), df.tug3_no.to_numpy()):
+            for row in np.flatnonzero(pd.notnull(col)):
+                self.rows.setdefault(col[row], []).append(row)
+        self.rows = {tug_no: np.unique(rows) for tug_no, rows in self.rows.items()}
+
+        self.sailing_status = df.sailing_status.to_numpy()
+        self.port = df.port.to_numpy()
+        self.place2 = df.place2.to_numpy()
+        self.max_end_time = df.max_end_time
+
+    def last_row(self, row, tug_no):
+        """Return the last row before row which the tug worked on, or None
+        """
+        rows = self.rows.get(tug_no)
+        if rows is None:
+            return None
+        i = np.searchsorted(rows, row) - 1
+        return rows[i] if i >= 0 else None
+
+
+_tug_index = None
+
+
 def tug_last_info(df, row, tug_no):
+    global _tug_index
+    if _tug_index is None or _tug_index.df is not df:
+        _tug_index = TugIndex(df)
+
     last_pier = 0  
-    for i in range(row-1, -1, -1):
-        sh = df.iloc[i, :]
-        if sh.tug1_no == tug_no or sh.tug2_no == tug_no or sh.tug3_no == tug_no:
-            if sh.sailing_status == 'I':
-                last_pier = sh.place2
-            elif sh.sailing_status == 'O':
-                last_pier = int(sh.port) + 9000
-            elif sh.sailing_status == 'T':
-                last_pier = sh.place2
-            last_time = sh.max_end_time
-            return get_pier_latlng(last_pier), last_time
+    i = _tug_index.last_row(row, tug_no)
+    if i is not None:
+        status = _tug_index.sailing_status[i]
+        if status == 'I':
+            last_pier = _tug_index.place2[i]
+        elif status == 'O':
+            last_pier = int(_tug_index.port[i]) + 9000
+        elif status == 'T':
+            last_pier = _tug_index.place2[i]
+        last_time = _tug_index.max_end_time.iloc[i]
+        return get_pier_latlng(last_pier), last_time
 
     # no last place in history data
     return get_pier_latlng(TUG_STARTING_PLACE), SYSTEM_TIME
@@ -163,58 +221,75 @@ def get_data(row_start, row_end, from_hist=False):
     else:
         rows = list(range(row_start, row_end))
     
-    for row in rows:
-        sh = df.iloc[row, :]
-        if sh.tug_cnt > 2:
+    # columns of the requested rows, scalars are the same as of df.iloc[row, :]
+    df = load_history()
+    frame = df.iloc[rows]
+    sailing_status = frame.sailing_status.to_numpy()
+    ship_no = frame.ship_no.to_numpy()
+    tug_cnt = frame.tug_cnt.to_numpy()
+    total_weight = frame.total_weight.to_numpy()
+    port = frame.port.to_numpy()
+    place1 = frame.place1.to_numpy()
+    place2 = frame.place2.to_numpy()
+    park = frame.park.to_numpy()
+    wind = frame.wind.to_numpy()
+    start_time = list(frame.start_time)
+    tug_nos = [frame.iloc[:, i].to_numpy() for i in range(15, 18)]
+    if from_hist:
+        pilot_wait_time = frame.pilot_wait_time.to_numpy()
+        mean_work_time = frame.mean_work_time.to_numpy()
+
+    for k, row in enumerate(rows):
+        if tug_cnt[k] > 2:
             continue
-        if sh.sailing_status == 'I':
-            ship = Ship(ship_id=int(sh.ship_no),
+        if sailing_status[k] == 'I':
+            ship = Ship(ship_id=int(ship_no[k]),
                         cur_pos=(0, 0),
-                        weight=sh.total_weight)  # temp place
-            company = get_company('I', int(sh.port) + 9000, int(sh.place2))
+                        weight=total_weight[k])  # temp place
+            company = get_company('I', int(port[k]) + 9000, int(place2[k]))
             task = Task(i=cnt+1,
                         ship=ship,
-                        tug_cnt=sh.tug_cnt,
+                        tug_cnt=tug_cnt[k],
                         ship_state=ShipState.IN,
-                        start_time=sh.start_time,
-                        start=int(sh.port) + 9000,
-                        dest=int(sh.place2),
-                        side=find_side(sh.park),
+                        start_time=start_time[k],
+                        start=int(port[k]) + 9000,
+                        dest=int(place2[k]),
+                        side=find_side(park[k]),
                         priority=TaskPriority.URGENT,
-                        wind_lev=sh.wind,
+                        wind_lev=wind[k],
                         company = company)
             
 
-        elif sh.sailing_status == 'O':
-            ship = Ship(ship_id=int(sh.ship_no),
-                        cur_pos=get_pier_latlng(sh.place2),
-                        weight=sh.total_weight)
-            company = get_company('O', int(sh.place2), int(sh.port) + 9000)
+        elif sailing_status[k] == 'O':
+            ship = Ship(ship_id=int(ship_no[k]),
+                        cur_pos=get_pier_latlng(place2[k]),
+                        weight=total_weight[k])
+            company = get_company('O', int(place2[k]), int(port[k]) + 9000)
             task = Task(i=cnt+1,
                         ship=ship,
-                        tug_cnt=sh.tug_cnt,
+                        tug_cnt=tug_cnt[k],
                         ship_state=ShipState.OUT,
-                        start_time=sh.start_time,
-                        start=int(sh.place2),
-                        dest=int(sh.port) + 9000,
-                        side=find_side(sh.park),
-                        wind_lev=sh.wind,
+                        start_time=start_time[k],
+                        start=int(place2[k]),
+                        dest=int(port[k]) + 9000,
+                        side=find_side(park[k]),
+                        wind_lev=wind[k],
                         company = company)
 
-        elif sh.sailing_status == 'T':
-            ship = Ship(ship_id=int(sh.ship_no),
-                        cur_pos=get_pier_latlng(sh.place1),
-                        weight=sh.total_weight)
-            company = get_company('T', int(sh.place1), int(sh.place2))            
+        elif sailing_status[k] == 'T':
+            ship = Ship(ship_id=int(ship_no[k]),
+                        cur_pos=get_pier_latlng(place1[k]),
+                        weight=total_weight[k])
+            company = get_company('T', int(place1[k]), int(place2[k]))            
             task = Task(i=cnt+1,
                         ship=ship,
-                        tug_cnt=sh.tug_cnt,
+                        tug_cnt=tug_cnt[k],
                         ship_state=ShipState.TRANSFER,
-                        start_time=sh.start_time,
-                        start=int(sh.place1),
-                        dest=int(sh.place2),
-                        side=find_side(sh.park),
-                        wind_lev=sh.wind,
+                        start_time=start_time[k],
+                        start=int(place1[k]),
+                        dest=int(place2[k]),
+                        side=find_side(park[k]),
+                        wind_lev=wind[k],
                         company = company)
 
         history_ships.append(ship)
@@ -222,19 +297,19 @@ def get_data(row_start, row_end, from_hist=False):
 
         cnt += 1
         
-        for i in range(15, 18):
-            if pd.isnull(sh[i]):
+        for col in tug_nos:
+            if pd.isnull(col[k]):
                 break
-            # elif sh[i] not in tid_list:
-            tug_no = int(sh[i])
+            # elif col[k] not in tid_list:
+            tug_no = int(col[k])
             tid_list.add(tug_no)
             hp = tug_no_to_hp(tug_no)
             place, time = tug_last_info(df, row, tug_no)
-            new_tug = Tug(tug_no, place, hp_to_charge_type(hp), hp, time, sh.start_time)
+            new_tug = Tug(tug_no, place, hp_to_charge_type(hp), hp, time, start_time[k])
             if new_tug.tug_id not in history_tugs_id :
                 history_tugs.append(new_tug)
                 history_tugs_id.append(new_tug.tug_id)
-            elif sh.start_time.to_pydatetime().hour >= 20:
+            elif start_time[k].to_pydatetime().hour >= 20:
                 history_tugs.append(new_tug)
                 # for i in history_tugs:
                 #     if i.tug_id == new_tug.tug_id:
@@ -245,12 +320,12 @@ def get_data(row_start, row_end, from_hist=False):
             if from_hist:
                 task.tugs.append(new_tug)
             # if from_hist:
-            #     task.tugs.append(get_tug_instance(sh[i]))
+            #     task.tugs.append(get_tug_instance(col[k]))
         
         if from_hist:
             task.task_state = TaskState.PROCESSED
-            task.start_time_real = sh.start_time + timedelta(minutes=sh.pilot_wait_time.item())
-            task.work_time = timedelta(minutes=sh.mean_work_time.item())
+            task.start_time_real = start_time[k] + timedelta(minutes=pilot_wait_time[k].item())
+            task.work_time = timedelta(minutes=mean_work_time[k].item())
 
     history_tugs.sort(key=lambda tug: tug.type)
     return history_tasks, history_tugs
\ No newline at end of file
@@ -0,0 +1,60 @@
+"""Logging of the simulation
+
+Every module logs to logging.getLogger(__name__) under this package and
+nothing below WARNING is shown until configure_logging() is called.
+"""
+
+import json
+import logging
+
+PACKAGE = __name__.rpartition('.')[0]
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format a record as one JSON object per line, with the fields passed
+    to the logging call as extra={"data": {...}}
+    """
+
+    def format(self, record):
+        line = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        line.update(getattr(record, 'data', {}))
+        return json.dumps(line, default=str, ensure_ascii=False)
+
+
+def configure_logging(level=logging.INFO, json_lines=None, stream=None):
+    """Show the logs of the simulation
+
+    Args:
+        level (int or str): the lowest level shown, e.g. logging.DEBUG for every event
+        json_lines (str): path of a file to append the records as JSON lines, optional
+        stream (file): where the readable records go, None for stderr, False to disable
+
+    Returns:
+        (logging.Logger): the logger of the package
+    """
+    logger = logging.getLogger(PACKAGE)
+    logger.setLevel(level)
+    for handler in list(logger.handlers):
+        if getattr(handler, '_algo', False):
+            logger.removeHandler(handler)
+            handler.close()
+
+    handlers = []
+    if stream is not False:
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        handlers.append(handler)
+    if json_lines:
+        handler = logging.FileHandler(json_lines, encoding='utf-8')
+        handler.setFormatter(JsonLinesFormatter())
+        handlers.append(handler)
+
+    for handler in handlers:
+        handler._algo = True
+        logger.addHandler(handler)
+    return logger
@@ -38,8 +38,11 @@ class Tug():
         tasks ([Task]):       A list of tasks the tug have served
         ts ([datetime]):      A list of timestamp when the tug starts to move, starts and ends a task
 
+        state_epoch (int):    Class attribute counting the changes of states of all tugs
     """
 
+    state_epoch = 0
+
     def __init__(self, tug_id, cur_pos, charge_type, hp, 
         next_available_time, duty_period, state=TugState.FREE, velo=TUG_SPEED):
         self.tug_id = tug_id
@@ -55,6 +58,16 @@ class Tug():
         self.tasks = deque([])
         self.ts = deque([])
 
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        if state is not getattr(self, "_state", None):
+            Tug.state_epoch += 1
+        self._state = state
+
     def __str__(self):
         return (
             "------------ Tug {} ------------\n".format(self.tug_id) +
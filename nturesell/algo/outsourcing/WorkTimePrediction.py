@@ -1,15 +1,43 @@
 import numpy as np
 import pandas as pd
-import sklearn
 import pickle
-from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
 import os
+from .forest import FlatForest
 loc = os.path.dirname(__file__) + '/'
 
+# raw features of a sample, in the order of a row given to run_batch
+FEATURES = ["sailing_status", "port", "tug_cnt", "total_weight", "weight_level", "dist",
+            "wind", "park", "reverse", "month", "weekday", "hour", "avg_hp"]
+
+# columns of the model input
+COLUMNS = ['total_weight', 'weight_level', 'dist', 'wind', 'avg_hp', \
+           "['port']_1", "['port']_2", "['tug_cnt']_1", "['tug_cnt']_2", "['tug_cnt']_3", \
+           "['park']_l", "['park']_o", "['park']_r", "['reverse']_0","['reverse']_1", \
+           "['month']_1", "['month']_2", "['month']_3","['month']_4", \
+           "['month']_5", "['month']_6", "['month']_7","['month']_8", \
+           "['month']_9", "['month']_10", "['month']_11","['month']_12", \
+           "['hour']_0", "['hour']_1", "['hour']_2", "['hour']_3", \
+           "['hour']_4", "['hour']_5", "['hour']_6", "['hour']_7", "['hour']_8", \
+           "['hour']_9", "['hour']_10", "['hour']_11", "['hour']_12", \
+           "['hour']_13", "['hour']_14", "['hour']_15", "['hour']_16", \
+           "['hour']_17", "['hour']_18", "['hour']_19", "['hour']_20", \
+           "['hour']_21", "['hour']_22", "['hour']_23", "['weekday']_0", \
+           "['weekday']_1", "['weekday']_2", "['weekday']_3", "['weekday']_4", \
+           "['weekday']_5", "['weekday']_6"]
+COLUMN_INDEX = {col: i for i, col in enumerate(COLUMNS)}
+
+# attributes of the models and their pickles in model_new/
+MODELS = {"clf1": "clf_1", "clf2": "clf_2", "clf3": "clf_3",
+          "reg1_0": "reg_1_0", "reg1_1": "reg_1_1",
+          "reg2_0": "reg_2_0", "reg2_1": "reg_2_1",
+          "reg3_0": "reg_3_0", "reg3_1": "reg_3_1"}
+
 
 class WorkTimePrediction():
     """
     args:
+        - backend: "sklearn" to predict with the pickled models or "flat" to
+          predict with FlatForest copies of them, which give the same output
         - data: Should be an one-row pandas.dataframe, and the columns include:
           sailing_status: "I", "O" or "T"
           port: 1 or 2
@@ -24,64 +52,78 @@ class WorkTimePrediction():
           hour: hour of the time
           avg_hp: average horsepower of the tug boat
     """
-    def __init__(self): 
-        with open(loc+'model_new/clf_1.pickle', 'rb') as f:
-            self.clf1 = pickle.load(f)
-        with open(loc+'model_new/clf_2.pickle', 'rb') as f:
-            self.clf2 = pickle.load(f)
-        with open(loc+'model_new/clf_3.pickle', 'rb') as f:
-            self.clf3 = pickle.load(f)
-        
-        # regression model 
-        with open(loc+'model_new/reg_1_0.pickle', 'rb') as f:
-            self.reg1_0 = pickle.load(f)
-        with open(loc+'model_new/reg_1_1.pickle', 'rb') as f:
-            self.reg1_1 = pickle.load(f)
-        with open(loc+'model_new/reg_2_0.pickle', 'rb') as f:
-            self.reg2_0 = pickle.load(f)
-        with open(loc+'model_new/reg_2_1.pickle', 'rb') as f:
-            self.reg2_1 = pickle.load(f)
-        with open(loc+'model_new/reg_3_0.pickle', 'rb') as f:
-            self.reg3_0 = pickle.load(f)
-        with open(loc+'model_new/reg_3_1.pickle', 'rb') as f:
-            self.reg3_1 = pickle.load(f)
-        
-        self.data = pd.DataFrame([[0]*58],\
-                                 columns= list(['total_weight', 'weight_level', 'dist', 'wind', 'avg_hp', \
-                                "['port']_1", "['port']_2", "['tug_cnt']_1", "['tug_cnt']_2", "['tug_cnt']_3", \
-                                "['park']_l", "['park']_o", "['park']_r", "['reverse']_0","['reverse']_1", \
-                                "['month']_1", "['month']_2", "['month']_3","['month']_4", \
-                                "['month']_5", "['month']_6", "['month']_7","['month']_8", \
-                                "['month']_9", "['month']_10", "['month']_11","['month']_12", \
-                                "['hour']_0", "['hour']_1", "['hour']_2", "['hour']_3", \
-                                "['hour']_4", "['hour']_5", "['hour']_6", "['hour']_7", "['hour']_8", \
-                                "['hour']_9", "['hour']_10", "['hour']_11", "['hour']_12", \
-                                "['hour']_13", "['hour']_14", "['hour']_15", "['hour']_16", \
-                                "['hour']_17", "['hour']_18", "['hour']_19", "['hour']_20", \
-                                "['hour']_21", "['hour']_22", "['hour']_23", "['weekday']_0", \
-                                "['weekday']_1", "['weekday']_2", "['weekday']_3", "['weekday']_4", \
-                                "['weekday']_5", "['weekday']_6"]))
+    def __init__(self, backend="sklearn"): 
+        if backend not in ("sklearn", "flat"):
+            raise ValueError("Invalid backend. Expected one of ['sklearn', 'flat'].")
+        self.backend = backend
+
+        # model input of the sample given to preprocessing
+        self.data = np.zeros((1, len(COLUMNS)))
 
         self.status = "none"
         self.dm_col = ["port", "tug_cnt", "park", "reverse", "month", "hour", "weekday"]
         self.pr_col = ["dist", "weight_level", "total_weight", "wind", "avg_hp"]
+
+        # (position in FEATURES, column) of numerical features and
+        # (position in FEATURES, prefix of columns) of categorical ones
+        self.pr_idx = [(FEATURES.index(c), COLUMN_INDEX[c]) for c in self.pr_col]
+        self.dm_idx = [(FEATURES.index(c), "['" + c + "']_") for c in self.dm_col]
+
+    def __getattr__(self, name):
+        # the models are unpickled on first use
+        if name in MODELS:
+            self.load()
+            return self.__dict__[name]
+        raise AttributeError(name)
+
+    def load(self):
+        """Load the classification and regression models
+        """
+        for attr, name in MODELS.items():
+            with open(model_path(name), 'rb') as f:
+                model = pickle.load(f)
+            setattr(self, attr, FlatForest(model) if self.backend == "flat" else model)
+
+    def version(self):
+        """The backend and the modified times of the model files, None for missing
+        ones, without loading the models
+
+        Returns:
+            (tuple): what predictions kept between runs are valid for
+        """
+        mtimes = []
+        for name in MODELS.values():
+            try:
+                mtimes.append(os.path.getmtime(model_path(name)))
+            except OSError:
+                mtimes.append(None)
+        return (self.backend,) + tuple(mtimes)
+
+    def verify(self, rows):
+        """Compare the flattened models with the pickled ones
+
+        Args:
+            rows ([tuple]): samples with features in the order of FEATURES
+
+        Returns:
+            ([str]): names of the models whose predictions differ
+        """
+        X = self.encode(rows)
+        differ = []
+        for attr in MODELS:
+            model = getattr(self, attr)
+            flat = model if isinstance(model, FlatForest) else FlatForest(model)
+            if not np.array_equal(flat.predict(X), flat.model.predict(X)):
+                differ.append(attr)
+        return differ
         
     
     def preprocessing(self, df):
         self.df = df
-        for i in self.pr_col:
-            self.data.iloc[0][i] = self.df[i][0]
-                                      
-        # to categorical
-        for i in self.dm_col:
-            self.data.iloc[0][ "['" + i + "']_" + str(self.df.iloc[0][i]) ] = 1
-   
-        if self.df["sailing_status"][0] == "I":
-            self.status = "i"
-        elif self.df["sailing_status"][0] == "T":
-            self.status = "t"
-        elif self.df["sailing_status"][0] == "O":
-            self.status = "o"
+        row = [self.df[c].iloc[0] for c in FEATURES]
+        self.data[0] = 0
+        self.encode_row(row, self.data[0])
+        self.status = status_code(row[0])
 
     def predict(self):
         if self.status == "i":
@@ -115,6 +157,78 @@ class WorkTimePrediction():
         # print(pred_time)
         return pred_time
 
+    def encode(self, rows, out=None):
+        """Encode raw samples into a model input matrix
+
+        Args:
+            rows ([tuple]): samples with features in the order of FEATURES,
+                categorical values being codes such as "I" or "l"
+            out (numpy.ndarray): a buffer of at least len(rows) rows to be reused
+
+        Returns:
+            (numpy.ndarray): a len(rows) x len(COLUMNS) matrix
+        """
+        if out is None:
+            X = np.zeros((len(rows), len(COLUMNS)))
+        else:
+            X = out[:len(rows)]
+            X[:] = 0
+        for r, row in enumerate(rows):
+            self.encode_row(row, X[r])
+        return X
+
+    def encode_row(self, row, x):
+        """Write the features of a sample into a zeroed row x of the model input
+        """
+        for i, col in self.pr_idx:
+            x[col] = row[i]
+        for i, prefix in self.dm_idx:
+            col = COLUMN_INDEX.get(prefix + str(row[i]).lower())
+            if col is not None: # unseen category
+                x[col] = 1
+
+    def run_batch(self, rows):
+        """Predict working times of many samples with one classifier call
+        and one call per regressor for each sailing status
+
+        Args:
+            rows ([tuple]): samples with features in the order of FEATURES
+
+        Returns:
+            (numpy.ndarray): predicted working times in minutes
+        """
+        X = self.encode(rows)
+        status = np.array([status_code(row[0]) for row in rows])
+
+        models = {"i": (self.clf1, self.reg1_0, self.reg1_1),
+                  "t": (self.clf2, self.reg2_0, self.reg2_1),
+                  "o": (self.clf3, self.reg3_0, self.reg3_1)}
+        pred = np.zeros(len(rows))
+        for st, (clf, reg0, reg1) in models.items():
+            idx = np.flatnonzero(status == st)
+            if not len(idx):
+                continue
+            pred_clf = clf.predict(X[idx])
+            for label, reg in [(0, reg0), (1, reg1)]:
+                sub = idx[pred_clf == 0] if label == 0 else idx[pred_clf != 0]
+                if len(sub):
+                    pred[sub] = reg.predict(X[sub])
+        return pred
+
+
+
+def status_code(sailing_status):
+    """Model of a sailing status, "i", "t" or "o" for anything else
+    """
+    status = str(sailing_status).lower()
+    return status if status in ("i", "t") else "o"
+
+
+def model_path(name):
+    """Path of the pickle of a model named in MODELS
+    """
+    return loc + 'model_new/' + name + '.pickle'
+
 
 
 # df = pd.DataFrame([["T",1,1,27968,4,1502.6, 1,"L",0,1,1,21,5200]], \
@@ -0,0 +1,95 @@
+"""Flattened random forests predicting without the sklearn call overhead
+"""
+
+import numpy as np
+
+
+class FlatForest():
+    """A fitted RandomForestClassifier or RandomForestRegressor with the nodes
+    of all trees concatenated into NumPy arrays
+
+    Leaves point to themselves, so every sample walks all trees at once
+    for max_depth steps. Trees are summed in the order of the estimators as
+    sklearn does, which makes the predictions identical.
+
+    Args:
+        model: a fitted sklearn random forest with a single output
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.is_classifier = hasattr(model, "classes_")
+        if self.is_classifier:
+            self.classes_ = model.classes_
+
+        feature, threshold, left, right, value, roots = [], [], [], [], [], []
+        offset = 0
+        self.max_depth = 0
+        for est in model.estimators_:
+            tree = est.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == -1
+            nodes = np.arange(offset, offset + n)
+
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            left.append(np.where(is_leaf, nodes, tree.children_left + offset))
+            right.append(np.where(is_leaf, nodes, tree.children_right + offset))
+            if self.is_classifier:
+                # class probabilities of leaves, older sklearn keeps counts
+                # in the tree and normalises them in predict_proba
+                v = tree.value[:, 0, :len(self.classes_)]
+                normalizer = v.sum(axis=1)[:, np.newaxis]
+                if not np.allclose(normalizer, 1.0):
+                    normalizer[normalizer == 0.0] = 1.0
+                    v = v / normalizer
+                value.append(v)
+            else:
+                value.append(tree.value[:, 0, 0])
+            roots.append(offset)
+
+            offset += n
+            self.max_depth = max(self.max_depth, tree.max_depth)
+
+        self.feature = np.concatenate(feature).astype(np.intp)
+        self.threshold = np.concatenate(threshold)
+        self.left = np.concatenate(left).astype(np.intp)
+        self.right = np.concatenate(right).astype(np.intp)
+        self.value = np.concatenate(value)
+        self.roots = np.array(roots, dtype=np.intp)
+
+    def apply(self, X):
+        """Leaves reached by each sample in each tree
+
+        Args:
+            X (numpy.ndarray): model input, n_samples x n_features
+
+        Returns:
+            (numpy.ndarray): n_samples x n_trees node indices
+        """
+        # sklearn compares float32 features with float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        rows = np.arange(len(X))[:, np.newaxis]
+        node = np.tile(self.roots, (len(X), 1))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def _accumulate(self, X):
+        leaves = self.apply(X)
+        out = np.zeros((len(leaves),) + self.value.shape[1:])
+        for t in range(leaves.shape[1]):
+            out += self.value[leaves[:, t]]
+        out /= leaves.shape[1]
+        return out
+
+    def predict_proba(self, X):
+        assert self.is_classifier, "predict_proba of a regressor"
+        return self._accumulate(X)
+
+    def predict(self, X):
+        out = self._accumulate(X)
+        if self.is_classifier:
+            return self.classes_.take(np.argmax(out, axis=1), axis=0)
+        return out
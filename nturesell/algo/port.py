@@ -2,37 +2,188 @@
 """
 
 import os
+import numpy as np
 import pandas as pd
+from collections import namedtuple
+from functools import lru_cache
 from typing import Tuple
 
 file_dir = os.path.dirname(__file__)
 
 # port to pier distance
-df_port_to_pier = pd.read_excel(os.path.join(file_dir, "data/complete_dis.xlsx"), index_col="代號")
+PORT_TO_PIER_FILE = os.path.join(file_dir, "data/complete_dis.xlsx")
 
 # pier to pier distance
-df_pier_to_pier = pd.read_excel(os.path.join(file_dir, "data/complete_dis_meter.xlsx"), index_col=1)
+PIER_TO_PIER_FILE = os.path.join(file_dir, "data/complete_dis_meter.xlsx")
 
 # reverse: if 'L' then 0 順 1 逆
-df_reverse1 = pd.read_excel(os.path.join(file_dir, "data/左靠逆靠.xlsx"))
+REVERSE_FILE = os.path.join(file_dir, "data/左靠逆靠.xlsx")
+
+# cache of the tables built from the excel sheets
+TABLES_FILE = os.path.join(file_dir, "data/port_tables.npz")
+
+PORT_LATLNG = {9001: (22.616677, 120.265942), # port 1
+               9002: (22.552638, 120.316716)} # port 2
+
+# columns of the distances from each port in PORT_TO_PIER_FILE
+PORT_DIST_COLUMNS = {9001: "一港距離（進）", 9002: "二港距離（進）"}
+
+PierTables = namedtuple("PierTables", ["ids", "index", "latlng", "dist", "port_dist", "reverse"])
+
+
+@lru_cache(maxsize=None)
+def read_port_to_pier():
+    return pd.read_excel(PORT_TO_PIER_FILE, index_col="代號")
+
+
+@lru_cache(maxsize=None)
+def read_pier_to_pier():
+    return pd.read_excel(PIER_TO_PIER_FILE, index_col=1)
+
+
+@lru_cache(maxsize=None)
+def read_reverse():
+    return pd.read_excel(REVERSE_FILE)
+
+
+def _build_tables():
+    """Build dense lookup tables from the excel sheets
+
+    Returns:
+        ids (np.ndarray):   pier numbers, sorted
+        latlng (np.ndarray): (n, 2) float64 coordinates, NaN if unknown
+        dist (np.ndarray):  (n, n) float64 pier to pier distance, NaN if unknown
+        port_dist (np.ndarray): (n, 2) float64 distance from port 1 and 2, NaN if unknown
+        reverse (np.ndarray): (n, 2) float64 reverse flag at port 1 and 2, NaN if unknown
+    """
+    df_port_to_pier = read_port_to_pier()
+    df_pier_to_pier = read_pier_to_pier()
+    df_reverse = read_reverse().set_index("Unnamed: 0")
+
+    dist_piers = [int(c) for c in df_pier_to_pier.columns if not isinstance(c, str)]
+    ids = np.array(sorted(set(dist_piers) | set(int(p) for p in df_port_to_pier.index)
+                          | set(int(p) for p in df_reverse.index) | set(PORT_LATLNG)), dtype=np.int64)
+    index = _index(ids)
+
+    latlng = np.full((len(ids), 2), np.nan)
+    for pier, pos in df_port_to_pier["經緯度"].dropna().items():
+        latlng[index[int(pier)]] = [float(i) for i in pos.split(',')]
+    for pier, pos in PORT_LATLNG.items():
+        latlng[index[pier]] = pos
+
+    dist = np.full((len(ids), len(ids)), np.nan)
+    rows = [index[int(p)] for p in df_pier_to_pier.index]
+    cols = [index[p] for p in dist_piers]
+    dist[np.ix_(rows, cols)] = df_pier_to_pier[dist_piers].to_numpy(dtype=np.float64)
+
+    port_dist = np.full((len(ids), 2), np.nan)
+    rows = [index[int(p)] for p in df_port_to_pier.index]
+    port_dist[rows] = df_port_to_pier[list(PORT_DIST_COLUMNS.values())].to_numpy(dtype=np.float64)
+
+    reverse = np.full((len(ids), 2), np.nan)
+    rows = [index[int(p)] for p in df_reverse.index]
+    reverse[rows] = df_reverse[[9001, 9002]].to_numpy(dtype=np.float64)
+
+    return ids, latlng, dist, port_dist, reverse
+
+
+def _index(ids):
+    return {p: i for i, p in enumerate(ids.tolist())}
+
+
+@lru_cache(maxsize=None)
+def pier_tables() -> PierTables:
+    """Dense lookup tables of piers, read from TABLES_FILE unless
+    the excel sheets were modified after it was written
+
+    Returns:
+        (PierTables): ids, pier number to row of the tables, coordinates,
+            pier to pier distances, port to pier distances and reverse flags
+    """
+    mtimes = np.array([os.path.getmtime(f) for f in (PORT_TO_PIER_FILE, PIER_TO_PIER_FILE, REVERSE_FILE)])
+    try:
+        with np.load(TABLES_FILE) as cache:
+            if np.array_equal(cache["mtimes"], mtimes):
+                ids = cache["ids"]
+                return PierTables(ids, _index(ids), cache["latlng"], cache["dist"],
+                                  cache["port_dist"], cache["reverse"])
+    except (OSError, KeyError, ValueError):
+        pass
+
+    ids, latlng, dist, port_dist, reverse = _build_tables()
+    try:
+        np.savez(TABLES_FILE, mtimes=mtimes, ids=ids, latlng=latlng, dist=dist,
+                 port_dist=port_dist, reverse=reverse)
+    except OSError:
+        pass
+    return PierTables(ids, _index(ids), latlng, dist, port_dist, reverse)
+
+
+# tables loaded on first access as module attributes
+_LAZY = {
+    "df_port_to_pier": read_port_to_pier,
+    "df_pier_to_pier": read_pier_to_pier,
+    "df_reverse1": read_reverse,
+    "PIER_IDS": lambda: pier_tables().ids,
+    "PIER_INDEX": lambda: pier_tables().index,
+    "PIER_LATLNG": lambda: pier_tables().latlng,
+    "PIER_DIST": lambda: pier_tables().dist,
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        return _LAZY[name]()
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
+
+
+def pier_index(pier) -> int:
+    """Row of a pier in PIER_LATLNG and PIER_DIST, raises KeyError if unknown
+    """
+    return pier_tables().index[int(pier)]
+
+
+def pier_indices(piers) -> np.ndarray:
+    index = pier_tables().index
+    return np.fromiter((index[int(p)] for p in piers), dtype=np.intp)
+
+
+def pier_latlng_array(piers) -> np.ndarray:
+    """Coordinates of many piers as an (n, 2) array
+    """
+    return pier_tables().latlng[pier_indices(piers)]
+
+
+def pier_dist_array(piers1, piers2) -> np.ndarray:
+    """Element-wise pier to pier distances of two sequences of piers
+    """
+    return pier_tables().dist[pier_indices(piers1), pier_indices(piers2)]
 
 
 def get_portToPier_dist(port, pier):
-    portnum = 9001 if port == 1 else 9002
-    return (df_port_to_pier.loc[int(portnum), int(pier)])
+    t = pier_tables()
+    return float(t.port_dist[t.index[int(pier)], 0 if port == 1 else 1])
 
 
 def get_pierToPier_dist(pier1, pier2):
-    return df_pier_to_pier.loc[int(pier1), int(pier2)]
+    t = pier_tables()
+    return float(t.dist[t.index[int(pier1)], t.index[int(pier2)]])
 
 
 def get_pier_latlng(pier) -> Tuple[float, float]:
-    if pier == 9001: # port 1
-        return (22.616677, 120.265942)
-    elif pier == 9002: # port 2
-        return (22.552638, 120.316716)
+    t = pier_tables()
+    lat, lng = t.latlng[t.index[int(pier)]]
+    if lat != lat: # NaN
+        raise KeyError("No coordinate of pier {}".format(pier))
+    return (float(lat), float(lng))
+
 
-    return tuple([float(i) for i in df_port_to_pier.loc[int(pier), "經緯度"].split(',')])
+def _reverse_at(pier, port):
+    t = pier_tables()
+    flag = t.reverse[t.index[int(pier)], 0 if port == 9001 else 1]
+    if flag != flag: # NaN
+        raise KeyError("No reverse flag of pier {}".format(pier))
+    return bool(flag)
 
 
 def get_reverse(task):
@@ -40,14 +191,14 @@ def get_reverse(task):
     if task.ship_state == 'I':
         if task.start == 9001:
             if task.side == 'L':
-                reverse = bool(df_reverse1.loc[int(task.to), 9001])
+                reverse = _reverse_at(task.to, 9001)
             else:
-                reverse = not(bool(df_reverse1.loc[int(task.to), 9001]))
+                reverse = not(_reverse_at(task.to, 9001))
         elif task.start == 9002:
             if task.side == 'L':
-                reverse = bool(df_reverse1.loc[int(task.to), 9002])
+                reverse = _reverse_at(task.to, 9002)
             else:
-                reverse = not(bool(df_reverse1.loc[int(task.to), 9002]))
+                reverse = not(_reverse_at(task.to, 9002))
     elif task.ship_state == 'T':
         reverse = 0
     return reverse
@@ -1,19 +1,144 @@
 """providing worktime prediction
 """
 
-import numpy as np
-import pandas as pd
+import os
+import atexit
+import logging
+import pickle
+from collections import OrderedDict
 from datetime import timedelta
 from .outsourcing.WorkTimePrediction import WorkTimePrediction
 from .port import get_pierToPier_dist, get_reverse
+from .settings import PREDICTION_CACHE_SIZE, PREDICTION_CACHE_FILE, PREDICTION_BACKEND
+from .profiling import phase
 
+logger = logging.getLogger(__name__)
+
+
+class PredictionCache():
+    """Bounded LRU cache of predicted working times keyed on feature rows
+
+    Attributes:
+        maxsize (int): the maximum number of predictions kept, 0 to disable
+        hits (int):    the number of lookups answered by the cache
+        misses (int):  the number of lookups which needed the models
+    """
+
+    def __init__(self, maxsize=PREDICTION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """Return the cached working time in minutes, or None
+        """
+        minutes = self._data.get(key)
+        if minutes is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._data.move_to_end(key)
+        return minutes
+
+    def put(self, key, minutes):
+        if self.maxsize <= 0:
+            return
+        self._data[key] = float(minutes)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+        self.hits = self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data)}
+
+    def load(self, path, version=None):
+        """Add predictions saved by save() with the same version to the cache
+
+        Args:
+            path (str): the file given to save()
+            version: what the predictions are valid for, e.g. WorkTimePrediction.version()
+        """
+        for key, minutes in _saved(path, version):
+            self.put(key, minutes)
+
+    def save(self, path, version=None):
+        """Write the cache to path, merged with the predictions of the same
+        version other processes saved there
+        """
+        entries = OrderedDict(_saved(path, version))
+        entries.update(self._data)
+        items = list(entries.items())
+        if self.maxsize > 0:
+            items = items[-self.maxsize:]
+        # written to a temporary file of this process first, so readers never see a partial file
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            pickle.dump({'version': version, 'entries': items}, f)
+        os.replace(tmp, path)
+
+
+def _saved(path, version):
+    # the predictions in a file written by PredictionCache.save, none if it
+    # is missing, unreadable or of another version
+    try:
+        with open(path, 'rb') as f:
+            saved = pickle.load(f)
+    except FileNotFoundError:
+        return []
+    except Exception:
+        logger.warning("Unreadable prediction cache %s", path, exc_info=True)
+        return []
+    if not isinstance(saved, dict) or saved.get('version') != version:
+        logger.info("Ignore prediction cache %s of other models", path)
+        return []
+    return saved['entries']
+
+
+wpt = WorkTimePrediction(PREDICTION_BACKEND)
+cache = PredictionCache(PREDICTION_CACHE_SIZE)
+
+if PREDICTION_CACHE_FILE:
+    cache.load(PREDICTION_CACHE_FILE, wpt.version())
+    atexit.register(cache.save, PREDICTION_CACHE_FILE, wpt.version())
 
-wpt = WorkTimePrediction()
 
 def predict_worktime(task, tug_set):
     assert tug_set, "Empty tug list"
-    df = dfCreator(task, tug_set)
-    return (timedelta(minutes=wpt.run(df)[0]))
+    return predict_batch([task], [tug_set])[0]
+
+
+def predict_batch(tasks, tug_sets):
+    """Predict working times of many (task, tug set) pairs with one model pass
+
+    Args:
+        tasks ([Task]): a task for each tug set, may repeat the same task
+        tug_sets ([[Tug]]): candidate tug sets
+
+    Returns:
+        ([timedelta]): predicted working times in the same order
+    """
+    with phase('predict'):
+        rows = []
+        for task, tug_set in zip(tasks, tug_sets):
+            assert tug_set, "Empty tug list"
+            rows.append(feature_row(task, tug_set))
+
+        minutes = [cache.get(row) for row in rows]
+        missing = list(OrderedDict.fromkeys(row for row, m in zip(rows, minutes) if m is None))
+        if missing:
+            predicted = dict(zip(missing, wpt.run_batch(missing)))
+            for row, m in predicted.items():
+                cache.put(row, m)
+            minutes = [predicted[row] if m is None else m for row, m in zip(rows, minutes)]
+        return [timedelta(minutes=m) for m in minutes]
 
 
 def classify_weight_level(ship_weight: int):
@@ -25,53 +150,25 @@ def classify_weight_level(ship_weight: int):
     return 8
 
 
-def dfCreator(task, tug_set):
-    port = 1 if task.start == 9001 else 2
-    tug_cnt = len(tug_set)
+def feature_row(task, tug_set):
+    """Raw features of a (task, tug set) pair in the order of WorkTimePrediction.FEATURES,
+    with enums converted to the codes used by the model
+    """
+    time = task.start_time
+    return (_code(task.ship_state),
+            1 if task.start == 9001 else 2,
+            len(tug_set),
+            task.ship.weight,
+            classify_weight_level(task.ship.weight),
+            get_pierToPier_dist(task.start, task.to),
+            3,
+            str(_code(task.side)).lower(),
+            int(get_reverse(task)),
+            time.month,
+            time.weekday() + 1,
+            time.hour,
+            sum(tug.hp for tug in tug_set) / len(tug_set))
 
-    weight_lev = classify_weight_level(task.ship.weight)
-    dist = get_pierToPier_dist(task.start, task.to)
-    wind = 3
-    reverse = get_reverse(task)
 
-    # time
-    time = task.start_time
-    month = time.month
-    weekday = time.weekday() + 1
-    hour = time.hour
-
-    # avg_hp
-    avg_hp = 0
-    mysum = 0
-    for i in range(len(tug_set)):
-        mysum = mysum + tug_set[i].hp
-    avg_hp = mysum / len(tug_set)
-
-    # create dataframe
-    df = pd.DataFrame([[task.ship_state,
-                        port,
-                        tug_cnt,
-                        task.ship.weight,
-                        weight_lev,
-                        dist,
-                        wind,
-                        task.side,
-                        reverse,
-                        month,
-                        weekday,
-                        hour,
-                        avg_hp]],
-                      columns=list(["sailing_status",
-                                    "port",
-                                    "tug_cnt",
-                                    "total_weight",
-                                    "weight_level",
-                                    "dist",
-                                    "wind",
-                                    "park",
-                                    "reverse",
-                                    "month",
-                                    "weekday",
-                                    "hour",
-                                    "avg_hp"]))
-    return (df)
+def _code(value):
+    return getattr(value, "value", value)
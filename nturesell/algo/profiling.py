@@ -0,0 +1,136 @@
+"""Timing the phases of simulations
+
+Phases:
+    load:     reading the history data into tasks and tugs
+    duty:     finding the tugs on duty
+    events:   handling events, without the dispatching they trigger
+    dispatch: calling the dispatching algorithm, including predict
+    predict:  predicting working times
+    collect:  collecting the result
+"""
+
+import io
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+
+# the timer phase() reports to, set by PhaseTimer.activate()
+_active = None
+
+
+class PhaseTimer():
+    """Accumulate the time and the number of calls of named phases
+
+    Attributes:
+        times ({str: float}): seconds spent in each phase
+        calls ({str: int}):   number of times each phase was entered
+    """
+
+    def __init__(self):
+        self.times = defaultdict(float)
+        self.calls = defaultdict(int)
+
+    @contextmanager
+    def phase(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter() - start)
+
+    def add(self, name, seconds, calls=1):
+        self.times[name] += seconds
+        self.calls[name] += calls
+
+    def merge(self, phases):
+        """Add the phases of another timer, given as as_dict() or a PhaseTimer
+        """
+        if isinstance(phases, PhaseTimer):
+            phases = phases.as_dict()
+        for name, phase in phases.items():
+            self.add(name, phase['time'], phase['calls'])
+
+    def as_dict(self):
+        return {name: {'time': self.times[name], 'calls': self.calls[name]}
+                for name in self.times}
+
+    @contextmanager
+    def activate(self):
+        """Let phase() of this module report to this timer
+        """
+        global _active
+        previous, _active = _active, self
+        try:
+            yield self
+        finally:
+            _active = previous
+
+
+@contextmanager
+def phase(name):
+    """Time a phase with the active timer, if any
+    """
+    if _active is None:
+        yield
+    else:
+        with _active.phase(name):
+            yield
+
+
+def format_phases(phases, total=None):
+    """Lines of a table of phases sorted by time
+
+    Args:
+        phases (dict): as PhaseTimer.as_dict()
+        total (float): seconds of the whole run to show the shares of phases
+
+    Returns:
+        ([str]): the lines
+    """
+    lines = []
+    for name, phase in sorted(phases.items(), key=lambda p: -p[1]['time']):
+        line = "  {:<9}{:>9.3f} secs {:>8} calls".format(name, phase['time'], phase['calls'])
+        if total:
+            line += " {:>7.1%}".format(phase['time'] / total)
+        lines.append(line)
+    return lines
+
+
+@contextmanager
+def profiled(profiler=None, result=None):
+    """Run the body under cProfile or pyinstrument
+
+    Args:
+        profiler (str): 'cprofile', 'pyinstrument' or None to do nothing
+        result (dict): where the text report is stored with the key 'profile'
+    """
+    if profiler is None:
+        yield
+        return
+
+    if profiler == 'cprofile':
+        import cProfile
+        import pstats
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            out = io.StringIO()
+            pstats.Stats(prof, stream=out).sort_stats('cumulative').print_stats(30)
+            report = out.getvalue()
+    elif profiler == 'pyinstrument':
+        from pyinstrument import Profiler
+        prof = Profiler()
+        prof.start()
+        try:
+            yield
+        finally:
+            prof.stop()
+            report = prof.output_text()
+    else:
+        raise ValueError("Invalid profiler. Expected one of ['cprofile', 'pyinstrument'].")
+
+    if result is not None:
+        result['profile'] = report
@@ -0,0 +1,164 @@
+"""Store of summarized simulation results
+
+Simulations with the same algorithm, rows of history data, parameters of
+simu_params.py and seed give the same result, so repeated requests of the
+dashboard are served from the store instead of simulating again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from threading import Lock
+
+from . import simu_params
+
+logger = logging.getLogger(__name__)
+
+
+def simulation_params():
+    """The parameters of simu_params.py by name
+    """
+    return {k: v for k, v in vars(simu_params).items() if k.isupper()}
+
+
+def result_key(algorithm, row_start, row_end, seed, divided=False):
+    """Key of the result of a simulation
+
+    Args:
+        algorithm (function or str): the dispatching algorithm or its name
+        row_start (int or [int]): starting row(s) of the history data, as Estimator.row_start
+        row_end (int or [int]): ending row(s) of the history data, as Estimator.row_end
+        seed (int): random seed of the simulation
+        divided (bool): whether the tasks are divided by companies
+
+    Returns:
+        (str): hex digest of the inputs, or None if seed is None as the result is random
+    """
+    if seed is None:
+        return None
+    name = algorithm if isinstance(algorithm, str) else algorithm.__name__
+    inputs = [name, row_start, row_end, simulation_params(), seed, divided]
+    text = json.dumps(inputs, sort_keys=True, default=int)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+class ResultStore():
+    """Least recently used store of JSON-able results
+
+    Entries are kept in memory and, if directory is given, also as files in
+    it, so processes sharing the directory share the results.
+
+    Args:
+        maxsize (int): number of entries kept, the least recently used are evicted
+        directory (str): directory to keep the entries as files, or None
+    """
+
+    def __init__(self, maxsize=64, directory=None):
+        assert maxsize > 0, "Non-positive size"
+        self.maxsize = maxsize
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key):
+        """Return the entry of key, or None
+        """
+        if key is None:
+            return None
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+
+        value = self._load(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._put(key, value)
+        return value
+
+    def put(self, key, value):
+        """Keep value as the entry of key, nothing is kept if key is None
+        """
+        if key is None:
+            return
+        with self._lock:
+            self._put(key, value)
+        self._save(key, value)
+
+    def _put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(self.directory, name))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def _load(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                value = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning("Unreadable result %s in %s", key, self.directory, exc_info=True)
+            return None
+        # the modified time orders the files for eviction
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return value
+
+    def _save(self, key, value):
+        if not self.directory:
+            return
+        # written to a temporary file first, so readers never see a partial file
+        tmp = '{}.{}.tmp'.format(self._path(key), os.getpid())
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(value, f, default=str)
+        os.replace(tmp, self._path(key))
+        self._evict_files()
+
+    def _evict_files(self):
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                 if name.endswith('.json')]
+        if len(paths) <= self.maxsize:
+            return
+        paths.sort(key=_mtime)
+        for path in paths[:len(paths) - self.maxsize]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _mtime(path):
+    # files removed by another process meanwhile are evicted first
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return 0
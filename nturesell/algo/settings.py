@@ -24,3 +24,10 @@ class ExecState(Enum):
     ERROR = -1
     SUCCESS = 0
     PROBLEM = 1
+
+
+# worktime prediction
+
+PREDICTION_CACHE_SIZE = 100000 # 0 to disable the cache
+PREDICTION_CACHE_FILE = None   # path of a pickle to keep predictions between runs
+PREDICTION_BACKEND = "sklearn" # "sklearn" or "flat"
@@ -1,40 +1,48 @@
 import copy
 import math
+import logging
+import time as timer
 import numpy as np
 import pandas as pd
 from typing import List, Dict
 from datetime import timedelta, datetime, time
-from sys import stderr
 from random import random, randint, choice
 from collections import deque
 from .model import Task, Tug, Ship, TmpTask, TaskState, ShipState, TugState, ChargeType, Company
 from .event import Event, ConfirmTask, ChangeTypes, StartWork, StartTimeDelay, Canceled
-from .event import WorkTimeDelay, TempNeed, EndWork, Routine
+from .event import WorkTimeDelay, TempNeed, EndWork, Routine, EventQueue
 from .simu_params import *
 from .settings import WINDOW_SIZE, PENALTY, CALL_HELP_THR, ExecState
-from .utils.utility import count_move_time, get_pier_latlng, calculate_revenue
+from .utils.utility import count_move_time, get_pier_latlng, RevenueBatch
+from .tracing import event_record
+from .profiling import PhaseTimer
+
+logger = logging.getLogger(__name__)
 
 
 class Simulator:
 
-    def __init__(self, tasks: List[Task], tugs: List[Tug], help_tugs=[], subject=None, verbose=True):
+    def __init__(self, tasks: List[Task], tugs: List[Tug], help_tugs=[], subject=None, verbose=True,
+                 incremental=False, trace=None):
         self.all_tasks = tasks
         self.tasks_que = deque(sorted(tasks, key=lambda task: task.start_time))
         self.tugs = tugs
         self.help_tugs = help_tugs
         self.all_tugs = tugs
-        for i in self.all_tugs:
-            print("here",i.tug_id)
         self.system_time = self.tasks_que[0].start_time
         self.subject = subject
         self.verbose = verbose
+        # events are logged at INFO if verbose, else at DEBUG
+        self.log_level = logging.INFO if verbose else logging.DEBUG
         self.call_help = True if help_tugs else False
         self.pre_duty_tugs = []
+        self.shift_tugs = {}
+        self.duty_key = None
 
         if subject and subject not in Company:
             raise ValueError("Wrong company.")
 
-        self.events: List[Event] = []
+        self.events = EventQueue()
         self.change_events: List[ChangeTypes] = []
         self.start_events: List[StartWork] = []
         self.confirm_events: List[ConfirmTask] = []
@@ -45,6 +53,17 @@ class Simulator:
 
         self.result = {}
         self.n_calls = 0
+
+        # skip dispatching when nothing it reads changed since the last call
+        self.incremental = incremental
+        self.n_saved = 0
+        # inputs of the last dispatching if it left them unchanged
+        self.last_dispatch = None
+
+        # sink with a write(record) method receiving every handled event, e.g. TraceWriter
+        self.trace = trace
+        self.dispatch_latency = None
+        self.timer = PhaseTimer()
              
         
     def segment(self, time):
@@ -53,8 +72,8 @@ class Simulator:
            new_tasks.append(self.tasks_que.popleft())
 
         if new_tasks:
-            if self.verbose:
-                print("[Add Tasks]", [task.id for task in new_tasks])
+            if logger.isEnabledFor(self.log_level):
+                logger.log(self.log_level, "[Add Tasks] %s", [task.id for task in new_tasks])
             self.tasks.extend(new_tasks)
             self.gen_init_events(new_tasks)
 
@@ -78,36 +97,46 @@ class Simulator:
         return start_time, end_time  
     
     def get_duty_tugs(self):
-        for i in self.all_tugs:
-            print("all tugs",i.tug_id,i.next_available_time)
-        start_time , end_time = self.get_duty_period(self.system_time)
+        """Tugs busy from the previous duty followed by the tugs of the present one
+
+        The roster is rebuilt only when system_time enters another duty period
+        or a tug changes its state, otherwise the last one is returned.
+        """
+        with self.timer.phase('duty'):
+            start_time , end_time = self.get_duty_period(self.system_time)
+            key = (start_time, end_time, Tug.state_epoch)
+            if key != self.duty_key:
+                self.duty_key = key
+                self.pre_duty_tugs = self.build_duty_tugs(start_time, end_time)
+            return list(self.pre_duty_tugs)
+
+    def build_duty_tugs(self, start_time, end_time):
         # tug of previous duty
         ori_tugs = [tug for tug in self.all_tugs if tug.state == TugState.BUSY] 
         # tug of present duty
-        tugs = [tug for tug in self.all_tugs if start_time <= tug.duty_period and tug.duty_period <= end_time]
-        unique_tug_id = list(set([ i.tug_id  for i in tugs ])) # tug of present duty
-        collect_tug_id = list(set([ i.tug_id for i in ori_tugs])) # tug of previous duty did not finish work
+        if (start_time, end_time) not in self.shift_tugs:
+            self.shift_tugs[(start_time, end_time)] = [tug for tug in self.all_tugs 
+                if start_time <= tug.duty_period and tug.duty_period <= end_time]
+        tugs = self.shift_tugs[(start_time, end_time)]
+        unique_tug_id = set(i.tug_id for i in tugs) # tug of present duty
+        collect_tug_id = set(i.tug_id for i in ori_tugs) # tug of previous duty did not finish work
         unique_tugs = ori_tugs # tug of previous duty did not finish work
-        pre_tugs_id = list(set([ i.tug_id for i in self.pre_duty_tugs]))
+        pre_tugs = {i.tug_id: i for i in self.pre_duty_tugs}
         ## select the tug didn't finish work and other tug on duty now
         for t in tugs:
-            if t.tug_id in unique_tug_id and t.tug_id in pre_tugs_id and t.tug_id not in collect_tug_id:
-                for pre_t in self.pre_duty_tugs:
-                        if t.tug_id == pre_t.tug_id:
-                            t.next_available_time = pre_t.next_available_time
-            if t.tug_id in unique_tug_id and t.tug_id not in collect_tug_id and t not in set(unique_tugs):
+            if t.tug_id in collect_tug_id:
+                continue
+            if t.tug_id in pre_tugs:
                 ## update the tugs next_available time if keep on duty
-                unique_tugs.append(t)
-                collect_tug_id.append(t.tug_id)
+                t.next_available_time = pre_tugs[t.tug_id].next_available_time
+            unique_tugs.append(t)
+            collect_tug_id.add(t.tug_id)
         if len(unique_tugs) < 3:
             while len(unique_tugs) < 4:
                 for i in range(len(self.all_tugs)):
                     if self.all_tugs[i].tug_id not in unique_tug_id:
                         unique_tugs.append(self.all_tugs[i])
-                        unique_tug_id = list(set([ i.tug_id  for i in unique_tugs]))
-        # for i in unique_tugs:
-        #     print("tug on duty",i.tug_id,"next_available_time",i.next_available_time) 
-        self.pre_duty_tugs = unique_tugs
+                        unique_tug_id = set(i.tug_id for i in unique_tugs)
         assert len(unique_tugs) >= 2, 'not enough tug to dispatch, if ask for three tugs {}'.format(unique_tugs)
         return unique_tugs
 
@@ -116,23 +145,35 @@ class Simulator:
         """
 
         self.method = method
+        with self.timer.activate():
+            self.handle_events()
+            with self.timer.phase('collect'):
+                self.collect_result()
+        self.result['phases'] = self.timer.as_dict()
+        return self.result
+
+    def handle_events(self):
         while self.tasks_que:
             self.segment(self.tasks_que[0].start_time)
             self.tugs = self.get_duty_tugs()
             self.schedule()
-            self.events.sort(key=lambda event: (event.time, event.order))
 
             while self.events:
-                event = self.events.pop(0)
+                event = self.events.pop()
                 self.system_time = event.time
                 add_new = self.segment(event.time)     
                 self.tugs = self.get_duty_tugs()
                 if type(event) is not Routine and event.task.task_state is TaskState.CANCELED:
                     continue
 
-                if self.verbose:
-                    print(event)
+                if logger.isEnabledFor(self.log_level):
+                    logger.log(self.log_level, "%s", event,
+                        extra={'data': {'event': type(event).__name__, 'sim_time': event.time,
+                                        'task': event.task.id if event.task else None}})
+                t_event = timer.perf_counter()
                 handle_state = event.handle()
+                # a temp need of a processed task is only traced
+                needless = False
 
                 # additional process according to event type
                 if type(event) is ConfirmTask and type(event.task) is TmpTask:
@@ -143,7 +184,7 @@ class Simulator:
                 elif type(event) is ChangeTypes or type(event) is StartTimeDelay:
                     if handle_state is ExecState.PROBLEM:
                         confirm = next(eve for eve in event.task.events if type(eve) is ConfirmTask)
-                        self.events.append(confirm)
+                        self.events.push(confirm)
 
                 elif type(event) is StartWork:
                     self.insert_event(self.gen_work_delay_event(event.task))
@@ -159,20 +200,26 @@ class Simulator:
 
                 elif type(event) is TempNeed:
                     if event.task.task_state is TaskState.PROCESSED:
-                        continue
-                    self.handle_tmp_task(event)
+                        needless = True
+                    else:
+                        self.handle_tmp_task(event)
                 
                 elif type(event) is EndWork:
                     self.tasks.remove(event.task)
+                self.timer.add('events', timer.perf_counter() - t_event)
 
                 # Call dispatch algorithm
-                if (type(event) in [Routine, WorkTimeDelay, StartTimeDelay,
+                if not needless and ((type(event) in [Routine, WorkTimeDelay, StartTimeDelay,
                     ChangeTypes, TempNeed, Canceled])  or add_new \
-                        or (type(event) is ConfirmTask and event.task.id < 0):
+                        or (type(event) is ConfirmTask and event.task.id < 0)):
                     self.schedule()
+                    if self.trace is not None:
+                        self.trace.write(event_record(event, handle_state, self.dispatch_latency))
+                elif self.trace is not None:
+                    self.trace.write(event_record(event, handle_state))
 
                 # Check if gap between events is too large
-                if any(task.task_state is TaskState.UNPROCESSED_UNASSIGNED \
+                if not needless and any(task.task_state is TaskState.UNPROCESSED_UNASSIGNED \
                     for task in self.all_tasks):
                     
                     for eve in self.events:
@@ -188,17 +235,13 @@ class Simulator:
                     #     self.events[i].time - event.time > timedelta(minutes=ROUTINE_DISPATCH)):
                     #     self.insert_event(Routine(None, event.time+timedelta(hours=1)))
 
-                self.events.sort(key=lambda event: (event.time, event.order))
-
-        self.collect_result()
-        return self.result
-
 
     ## ------------ Methods dispatching tasks and assign tugs to tasks ------------
 
     def schedule(self):
         """Execute the dispatching algorithm
         """
+        self.dispatch_latency = None
         task_dp = [t for t in self.tasks if t.task_state == TaskState.UNPROCESSED_UNASSIGNED]
         task_dp.sort(key=lambda task: task.start_time)
         all_tasks = self.tmp_tasks + task_dp
@@ -213,42 +256,74 @@ class Simulator:
                     tug.next_available_time -= task.ori_task.extra_wait
 
         if all_tasks:
-            self.n_calls += 1
-            if self.n_calls == 1:
-                self.tugs = self.get_duty_tugs()
-            if self.verbose:
-                print("\n[Scheduling] Dispatch {} tasks with {}...".format(len(all_tasks), 
-                    self.method.__name__), file=stderr)
-
-            if self.call_help:
-                tug_sets, times = self.method(all_tasks, self.tugs, self.help_tugs, 
-                    True, CALL_HELP_THR, self.system_time)
-                if random() < HELP_FAILED_PROB:
-                    if self.verbose: print("[Call Help Failed!]")
-                    tug_sets, times = self.method(all_tasks, self.tugs, [], 
-                    False, CALL_HELP_THR, self.system_time)
-                self.assign(all_tasks, tug_sets, times)
+            # the dispatchers draw no random numbers, so drawing first keeps the
+            # random stream and avoids dispatching twice when help fails
+            help_failed = self.call_help and random() < HELP_FAILED_PROB
+            key = self.dispatch_key(all_tasks, help_failed) if self.incremental else None
+
+            if key is not None and key == self.last_dispatch:
+                self.n_saved += 1
+                logger.log(self.log_level, "[Scheduling] Nothing changed, keep the last dispatching")
             else:
-                tug_sets, times = self.method(all_tasks, self.tugs, [], 
-                    False, CALL_HELP_THR, self.system_time)
-                self.assign(all_tasks, tug_sets, times)
-            
-            # Update confirming and starting time
-            self.update_tasks_time(all_tasks)
-
-            # If a tug which is serving a task delayed by temp need,
-            # its next available time will be updated in update_tmp_task
-            # and the starting time of the undone tasks served by the tug
-            # will also be delayed, so we need to redispatch
-            # => should be implemented in dispatching algorithms
+                self.dispatch(list(all_tasks), help_failed)
+                # the same inputs give the same dispatching, which is only kept
+                # as it is if it did not change its own inputs
+                if key is not None and key != self.dispatch_key(all_tasks, help_failed):
+                    key = None
+                self.last_dispatch = key
 
             for event in self.confirm_events:
                 event.time = event.task.last_tug_move
+                self.events.reschedule(event)
             for event in self.start_events:
                 event.time = event.task.start_time_real
+                self.events.reschedule(event)
+
+    def dispatch(self, tasks, help_failed):
+        """Run the dispatching algorithm on tasks and assign the tugs it returns
+        """
+        self.n_calls += 1
+        if self.n_calls == 1:
+            self.tugs = self.get_duty_tugs()
+        logger.log(self.log_level, "[Scheduling] Dispatch %d tasks with %s...", len(tasks),
+            self.method.__name__)
 
-            if self.verbose:
-                print("")
+        t_start = timer.perf_counter()
+        if self.call_help and not help_failed:
+            tug_sets, times = self.method(tasks, self.tugs, self.help_tugs, 
+                True, CALL_HELP_THR, self.system_time)
+        else:
+            if help_failed: logger.log(self.log_level, "[Call Help Failed!]")
+            tug_sets, times = self.method(tasks, self.tugs, [], 
+                False, CALL_HELP_THR, self.system_time)
+        self.dispatch_latency = timer.perf_counter() - t_start
+        self.timer.add('dispatch', self.dispatch_latency)
+        self.assign(tasks, tug_sets, times)
+
+        # Update confirming and starting time
+        self.update_tasks_time(tasks)
+
+        # If a tug which is serving a task delayed by temp need,
+        # its next available time will be updated in update_tmp_task
+        # and the starting time of the undone tasks served by the tug
+        # will also be delayed, so we need to redispatch
+        # => should be implemented in dispatching algorithms
+
+    def dispatch_key(self, tasks, help_failed):
+        """Everything a dispatching reads from the tasks and tugs, None if it
+        must run anyway because temp tasks are waiting
+
+        Returns:
+            (tuple): fingerprints of the tasks, of the tugs and whether help fails
+        """
+        if self.tmp_tasks:
+            return None
+        tugs = list(self.tugs) + (list(self.help_tugs) if self.call_help else [])
+        return (tuple((task.id, task.start_time, tuple(task.req_types), task.task_state,
+                       task.start_time_real, task.work_time, task.last_tug_move,
+                       tuple(tug.tug_id for tug in task.tugs)) for task in tasks),
+                tuple((tug.tug_id, tug.pos, tug.next_available_time, tug.state) for tug in tugs),
+                help_failed)
 
     def assign(self, tasks, tugss, times):
         """Assign tugs and generate new ComfirmTask if tugs change after comfirmation
@@ -323,6 +398,7 @@ class Simulator:
         for eve in task.events:
             if type(eve) is EndWork:
                 eve.time += (extra_wait - past_extra)
+                self.events.reschedule(eve)
                 break
         task.work_time += extra_wait
         tmp_task.work_time = task.start_time_real + task.work_time \
@@ -337,9 +413,8 @@ class Simulator:
         self.change_events.extend(ch)
         self.confirm_events.extend(cf)
         self.start_events.extend(st)
-        self.events.extend(ch+cf+self.gen_start_delay_events(tasks)+
-            st+self.gen_canceled_events(tasks))
-        self.events.sort(key=lambda event: event.time)
+        for event in ch+cf+self.gen_start_delay_events(tasks)+st+self.gen_canceled_events(tasks):
+            self.events.push(event)
 
     def gen_confirm_events(self, tasks) -> List[ConfirmTask]:
         events = []
@@ -478,11 +553,7 @@ class Simulator:
     def insert_event(self, event: Event):
         if event.task is not None:
             event.task.events.append(event)
-        for i, eve in enumerate(self.events):
-            if eve.time >= event.time:
-                self.events.insert(i, event)
-                return
-        self.events.insert(len(self.events), event)
+        self.events.push(event)
 
     def grade_result(self, req_types, tugs):
         if not tugs:
@@ -499,13 +570,7 @@ class Simulator:
 
     def collect_result(self):
         self.result['sum'] = {}
-        total_moving_cost = 0
-        total_moving_time = timedelta(0)
-        total_waiting_time = timedelta(0)
-        total_revenue = 0
-        mean_matched = 0
-        mean_over = 0
-        mean_under = 0
+        tasks = self.all_tasks
 
         # Initialize company's variables
         if self.subject:
@@ -518,6 +583,8 @@ class Simulator:
                     'managing_revenue': 0,
                 })
 
+        # Charge temporary tasks and tasks in one batch
+        batch = RevenueBatch()
         for task in self.done_tmp_tasks:
             ori_task = task.ori_task
             
@@ -525,71 +592,109 @@ class Simulator:
             ori_task.tugs_start_time.extend(task.tugs_start_time)
             ori_task.moving_time += task.moving_time
             ori_task.moving_cost += task.moving_cost
-            
-            # Calculate the task revenue
-            profit_period = [ori_task.start_time_real + ori_task.work_time - start \
-                for start in task.tugs_start_time]
-            ori_task.revenue += calculate_revenue(profit_period, task.req_types, task.tugs)
-
-        for task in self.all_tasks:
+            batch.add(ori_task.start_time_real + ori_task.work_time, task.tugs_start_time, 
+                task.req_types, task.tugs)
+            # as sorted by get_prices
+            task.req_types.sort()
+            task.tugs.sort(key=lambda tug: tug.type)
+
+        n_tmp = len(self.done_tmp_tasks)
+        grade_tasks, req_types, tug_types = [], [], []
+        for i, task in enumerate(tasks):
             if task.task_state is TaskState.CANCELED:
                 task.start_time_real = task.start_time
             task.waiting_time += task.start_time_real - task.start_time
-            task.waiting_cost = task.waiting_time.seconds / 60 * PENALTY * task.priority
-
-            profit_period = [task.start_time_real + task.work_time - start \
-            for start in task.tugs_start_time]
-            task.revenue += calculate_revenue(profit_period[:task.tug_cnt], 
+            batch.add(task.start_time_real + task.work_time, task.tugs_start_time[:task.tug_cnt], 
                 task.req_types[:task.tug_cnt], task.tugs[:task.tug_cnt])
-            task.profit = task.revenue - task.waiting_cost - task.moving_cost
-
-            total_moving_cost += task.moving_cost
-            total_moving_time += task.moving_time
-            total_waiting_time += task.waiting_time
-            total_revenue += task.revenue
-            matched, over, under = self.grade_result(task.req_types, task.tugs)
-            mean_matched += matched
-            mean_over += over
-            mean_under += under  
-
-        mean_matched /= len(self.all_tasks)
-        mean_over /= len(self.all_tasks)
-        mean_under /= len(self.all_tasks)
-        
+
+            pairs = min(len(task.req_types), len(task.tugs))
+            grade_tasks.extend([i] * pairs)
+            req_types.extend(task.req_types[:pairs])
+            tug_types.extend(tug.type for tug in task.tugs[:pairs])
+
+        revenues = batch.revenues()
+        for task, revenue in zip(self.done_tmp_tasks, revenues[:n_tmp].tolist()):
+            task.ori_task.revenue += revenue
+
+        # Columns of tasks
+        waiting_seconds = np.array([task.waiting_time.seconds for task in tasks], dtype=float)
+        priority = np.array([task.priority for task in tasks], dtype=float)
+        moving_cost = np.array([task.moving_cost for task in tasks], dtype=float)
+        revenue = np.array([task.revenue for task in tasks], dtype=float) + revenues[n_tmp:]
+        waiting_cost = waiting_seconds / 60 * PENALTY * priority
+        profit = revenue - waiting_cost - moving_cost
+        for task, r, w, p in zip(tasks, revenue.tolist(), waiting_cost.tolist(), profit.tolist()):
+            task.revenue = r
+            task.waiting_cost = w
+            task.profit = p
+
+        matched, over, under = self.grade_results(
+            np.array(grade_tasks, dtype=np.int64), np.array(req_types, dtype=np.int64), 
+            np.array(tug_types, dtype=np.int64), 
+            np.array([len(task.tugs) for task in tasks], dtype=float))
+
+        total_moving_cost = sum(moving_cost.tolist(), 0.0)
+        total_moving_time = sum((task.moving_time for task in tasks), timedelta(0))
+        total_waiting_time = sum((task.waiting_time for task in tasks), timedelta(0))
+        total_revenue = sum(revenue.tolist(), 0.0)
+
         self.result['sum']['tasks'] = self.all_tasks
         self.result['sum']['tugs'] = self.tugs
         self.result['sum']['moving_cost'] = total_moving_cost
         self.result['sum']['moving_time'] = total_moving_time
         self.result['sum']['waiting_time'] = total_waiting_time
-        self.result['sum']['matched'] = mean_matched
-        self.result['sum']['oversize'] = mean_over
-        self.result['sum']['undersize'] = mean_under
+        self.result['sum']['matched'] = sum(matched.tolist(), 0.0) / len(tasks)
+        self.result['sum']['oversize'] = sum(over.tolist(), 0.0) / len(tasks)
+        self.result['sum']['undersize'] = sum(under.tolist(), 0.0) / len(tasks)
         self.result['sum']['waiting_cost'] = total_waiting_time.seconds / 60 * PENALTY
         self.result['sum']['revenue'] = total_revenue
         self.result['sum']['profit'] = total_revenue - total_moving_cost - \
             self.result['sum']['waiting_cost']
         self.result['sum']['n_calls'] = self.n_calls
+        self.result['sum']['n_saved'] = self.n_saved
 
-        # Separate profit for two companies
+        # Separate profit for two companies by the first tug of each task
         if self.subject:
+            first = [task.tugs[0].company for task in tasks]
+            of_company = {c: np.array([company is c for company in first], dtype=bool) 
+                for c in [Company.KHPORT, Company.GANGCHIN]}
+            moving_seconds = np.array([task.moving_time.seconds for task in tasks], dtype=np.int64)
+
             r1, r2 = 1, 0.38
             for c in [Company.KHPORT, Company.GANGCHIN]:
-                self.result[c.value]['revenue'] += sum(r1 * task.revenue for task in self.all_tasks 
-                    if task.tugs[0].company is Company.KHPORT)
-                help_revenue = sum(r2 * task.revenue for task in self.all_tasks 
-                    if task.tugs[0].company is Company.GANGCHIN)
+                self.result[c.value]['revenue'] += sum(
+                    (r1 * revenue[of_company[Company.KHPORT]]).tolist(), 0.0)
+                help_revenue = sum((r2 * revenue[of_company[Company.GANGCHIN]]).tolist(), 0.0)
                 self.result[c.value]['revenue'] += help_revenue
                 self.result[c.value]['managing_revenue'] += r1 * help_revenue
-                self.result[c.value]['moving_cost'] += sum(task.moving_cost 
-                    for task in self.all_tasks if task.tugs[0].company is c)
-                self.result[c.value]['moving_time'] += timedelta(seconds=sum(
-                    task.moving_time.seconds for task in self.all_tasks \
-                        if task.tugs[0].company is c
-                ))
+                self.result[c.value]['moving_cost'] += sum(moving_cost[of_company[c]].tolist(), 0.0)
+                self.result[c.value]['moving_time'] += timedelta(
+                    seconds=int(moving_seconds[of_company[c]].sum()))
                 self.result[c.value]['profit'] = self.result[c.value]['revenue'] - \
                     self.result[c.value]['moving_cost']
                 r1, r2 = 1 - r1, 1 - r2
 
+    @staticmethod
+    def grade_results(tasks, req_types, tug_types, n_tugs):
+        """Grade the dispatched tugs of tasks at once, as grade_result of each
+
+        Args:
+            tasks (numpy.ndarray): index of the task of each pair of a required type and a tug
+            req_types (numpy.ndarray): the required type of each pair
+            tug_types (numpy.ndarray): the type of the tug of each pair
+            n_tugs (numpy.ndarray): number of tugs of each task
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray, numpy.ndarray): the shares of matched,
+                oversized and undersized tugs of each task
+        """
+        n = len(n_tugs)
+        counts = [np.bincount(tasks[mask], minlength=n) for mask in
+            [req_types == tug_types, req_types < tug_types, req_types > tug_types]]
+        # tasks without tugs are graded 0
+        n_tugs = np.where(n_tugs > 0, n_tugs, np.inf)
+        return tuple(count / n_tugs for count in counts)
+
     def get_delay_prob(self, task):
 
         if task.ship_state == ShipState.IN:
@@ -640,4 +745,33 @@ class Simulator:
             prob_agg += prob
             result += 0.2
 
-        return(timedelta(minutes= -1 * result * task.work_time.seconds/60))
\ No newline at end of file
+        return(timedelta(minutes= -1 * result * task.work_time.seconds/60))
+
+class SimulationState:
+    """Snapshot of the mutable fields of tasks and tugs, restored in place
+    to run another simulation on the same objects without deep copying them
+
+    Args:
+        groups ([[Task or Tug]]): lists of entities, an entity may appear in several lists
+    """
+
+    def __init__(self, *groups):
+        entities = {}
+        for group in groups:
+            for entity in group:
+                entities[id(entity)] = entity
+        self.entities = list(entities.values())
+        self.fields = [self._copy(vars(entity)) for entity in self.entities]
+
+    @staticmethod
+    def _copy(fields):
+        # containers are filled during a simulation, the objects in them are not
+        return {k: copy.copy(v) if isinstance(v, (list, deque, dict, set)) else v
+                for k, v in fields.items()}
+
+    def restore(self):
+        # states are restored without the setter of Tug.state
+        Tug.state_epoch += 1
+        for entity, fields in zip(self.entities, self.fields):
+            entity.__dict__.clear()
+            entity.__dict__.update(self._copy(fields))
@@ -0,0 +1,60 @@
+"""Simulator.run with incremental dispatching against dispatching on every call
+
+The work-time models are not needed, the predictions come from the features.
+"""
+
+import random
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from .. import predict_worktime
+from ..benchmark import synthetic_day
+from ..greedy.cool import cool_dispatch
+from ..greedy.timeline import timeline_dispatch
+from ..simulator import Simulator
+
+
+def run_batch(rows):
+    # minutes from the number of tugs and the ship weight
+    return [30 + 10 * row[2] + row[3] % 40 for row in rows]
+
+
+def simulate(algorithm, seed, n_tasks, incremental):
+    tasks, tugs = synthetic_day(seed, n_tasks=n_tasks)
+    random.seed(seed)
+    np.random.seed(seed)
+    predict_worktime.cache.clear()
+    result = Simulator(tasks, tugs, verbose=False, incremental=incremental).run(algorithm)
+    return result['sum']
+
+
+@mock.patch.object(predict_worktime.wpt, 'run_batch', run_batch)
+class IncrementalTest(unittest.TestCase):
+
+    def assertSameResult(self, algorithm, seed, n_tasks):
+        full = simulate(algorithm, seed, n_tasks, False)
+        incremental = simulate(algorithm, seed, n_tasks, True)
+        for key in ['profit', 'revenue', 'waiting_time', 'moving_time', 'moving_cost']:
+            self.assertEqual(incremental[key], full[key], key)
+        self.assertEqual([(task.id, task.start_time_real, task.work_time,
+                           [tug.tug_id for tug in task.tugs]) for task in incremental['tasks']],
+                         [(task.id, task.start_time_real, task.work_time,
+                           [tug.tug_id for tug in task.tugs]) for task in full['tasks']])
+        self.assertEqual(incremental['n_calls'] + incremental['n_saved'], full['n_calls'])
+        return incremental
+
+    def test_cool_dispatch(self):
+        n_saved = 0
+        for seed in range(4):
+            n_saved += self.assertSameResult(cool_dispatch, seed, 40)['n_saved']
+        self.assertGreater(n_saved, 0)
+
+    def test_timeline_dispatch(self):
+        for seed in (0, 2, 4):
+            self.assertSameResult(timeline_dispatch, seed, 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
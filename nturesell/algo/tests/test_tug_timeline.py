@@ -0,0 +1,214 @@
+"""TugTimeline and the delays of timeline_dispatch against the linear scans they replace
+
+Piers are numbered 0 to N_PIERS-1 and stand for their own coordinates, so
+moving times do not need the port tables.
+"""
+
+import random
+import unittest
+from datetime import datetime, timedelta
+from itertools import combinations
+from types import SimpleNamespace
+from unittest import mock
+
+from ..greedy import timeline, tug_timeline
+from ..greedy.tug_timeline import TugTimeline, merged_gaps
+
+N_PIERS = 12
+BASE = datetime(2017, 1, 1)
+
+
+def move_time(start, to):
+    return timedelta(minutes=7 * abs(start - to))
+
+
+def pier(p):
+    return p
+
+
+def linear_insertjob(nt, next_available_time, pos, jobs):
+    # insertjob of greedy/timeline3.py
+    if len(jobs) == 0:
+        jobs.insert(0, nt)
+        return True
+    for i in range(len(jobs)):
+        if i == 0:
+            prev = next_available_time
+            mt_f = move_time(pos, nt[2])
+        else:
+            prev = jobs[i-1][1]
+            mt_f = move_time(jobs[i-1][3], nt[2])
+        mt_b = move_time(nt[3], jobs[i][2])
+        if nt[1] + mt_b <= jobs[i][0] and nt[0] - mt_f >= prev:
+            jobs.insert(i, nt)
+            return True
+    if nt[0] - move_time(jobs[-1][3], nt[2]) >= jobs[-1][1]:
+        jobs.append(nt)
+        return True
+    return False
+
+
+def linear_merge(padded_lists):
+    # mergeTimeline of greedy/timeline3.py
+    final_lst = sorted([[s, e] for padded in padded_lists for s, e in padded], key=lambda x: x[0])
+    merged = final_lst[:1]
+    for current in final_lst:
+        previous = merged[-1]
+        if current[0] <= previous[1]:
+            previous[1] = max(previous[1], current[1])
+        else:
+            merged.append(current)
+    return merged
+
+
+def linear_delay(merged, s_time, work_time, available):
+    # cal_delay of greedy/timeline3.py after the timeline is elongated or merged
+    e_time = s_time + work_time
+    if len(merged) == 0:
+        return max(available - s_time, timedelta(0))
+    delaytime = timedelta(0)
+    for i in range(len(merged)):
+        prev = available if i == 0 else merged[i-1][1]
+        if s_time > prev:
+            if e_time < merged[i][0]:
+                return timedelta(0)
+            for j in range(i+1, len(merged)):
+                if work_time <= merged[j][0] - merged[j-1][1]:
+                    return merged[j-1][1] - s_time
+            delaytime = merged[-1][1] - s_time
+        else:
+            delaytime = timedelta(minutes=999999)
+    return delaytime
+
+
+def linear_best(task, cands, delay):
+    # the loop over candSet in timeline_dispatch
+    best = None
+    for cand in cands:
+        d = delay(task, cand)
+        if d == timedelta(0):
+            return cand, d
+        if best is None or d < best[1]:
+            best = (cand, d)
+    return best if best else (None, timedelta(0))
+
+
+def work_times(tasks, tug_sets):
+    return [timedelta(minutes=20 + sum(tug.hp for tug in tug_set) // 100 % 90) for tug_set in tug_sets]
+
+
+def random_job(rng, day=timedelta(days=2)):
+    start = BASE + timedelta(minutes=rng.randrange(int(day.total_seconds() // 60)))
+    return [start, start + timedelta(minutes=rng.randint(10, 180)),
+            rng.randrange(N_PIERS), rng.randrange(N_PIERS)]
+
+
+@mock.patch.object(tug_timeline, 'get_pier_latlng', pier)
+@mock.patch.object(tug_timeline, 'count_move_time', move_time)
+class TugTimelineTest(unittest.TestCase):
+
+    def test_insert_next_to_the_bisected_slot(self):
+        tl = TugTimeline()
+        jobs = [[BASE + timedelta(hours=10), BASE + timedelta(hours=11), 0, 0],
+                [BASE + timedelta(hours=13), BASE + timedelta(hours=14), 0, 0]]
+        for job in jobs:
+            self.assertTrue(tl.insert(job, BASE, 0))
+
+        # ending right when the next job starts
+        nt = [BASE + timedelta(hours=12), BASE + timedelta(hours=13), 0, 0]
+        self.assertTrue(tl.insert(nt, BASE, 0))
+        self.assertIs(tl.jobs[1], nt)
+        # starting right when the previous job ends
+        nt = [BASE + timedelta(hours=11), BASE + timedelta(hours=11, minutes=30), 0, 0]
+        self.assertTrue(tl.insert(nt, BASE, 0))
+        self.assertIs(tl.jobs[1], nt)
+        # before the first job, but not before the tug is available
+        nt = [BASE + timedelta(hours=8), BASE + timedelta(hours=9), 0, 0]
+        self.assertFalse(tl.insert(nt, BASE + timedelta(hours=8, minutes=30), 0))
+        self.assertTrue(tl.insert(nt, BASE + timedelta(hours=8), 0))
+        self.assertIs(tl.jobs[0], nt)
+        # overlapping a job
+        nt = [BASE + timedelta(hours=13, minutes=30), BASE + timedelta(hours=15), 0, 0]
+        self.assertFalse(tl.insert(nt, BASE, 0))
+        # fitting only without the moving time from the previous job
+        nt = [BASE + timedelta(hours=14), BASE + timedelta(hours=15), 1, 0]
+        self.assertFalse(tl.insert(nt, BASE, 0))
+        self.assertEqual(tl.starts, [job[0] for job in tl.jobs])
+
+    def test_insert_as_linear_scan(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            tl = TugTimeline()
+            jobs = []
+            available = BASE + timedelta(minutes=rng.randrange(600))
+            pos = rng.randrange(N_PIERS)
+            for _ in range(80):
+                nt = random_job(rng)
+                self.assertEqual(tl.insert(nt, available, pos),
+                                 linear_insertjob(list(nt), available, pos, jobs))
+                self.assertEqual(tl.jobs, jobs)
+            self.assertEqual(tl.starts, [job[0] for job in jobs])
+
+    def test_delay_as_linear_scan(self):
+        rng = random.Random(1)
+        for _ in range(300):
+            tls = []
+            for _ in range(rng.randint(1, 3)):
+                tl = TugTimeline()
+                for _ in range(rng.randint(0, 30)):
+                    tl.insert(random_job(rng), BASE, rng.randrange(N_PIERS))
+                tls.append(tl)
+
+            for _ in range(20):
+                start, to = rng.randrange(N_PIERS), rng.randrange(N_PIERS)
+                padded = [tl.padded(start, to) for tl in tls]
+                if len(tls) == 1:
+                    merged = tls[0].gaps(start, to)
+                    expected = padded[0]
+                else:
+                    merged = merged_gaps(tls, start, to)
+                    expected = linear_merge(padded)
+                self.assertEqual(list(zip(merged.starts, merged.ends)), [tuple(x) for x in expected])
+
+                task = SimpleNamespace(start_time=random_job(rng)[0])
+                available = BASE + timedelta(minutes=rng.randrange(-600, 1200))
+                prepared = (merged, available, timedelta(0))
+                delay, lower, zero = timeline.bound_delay(task, prepared)
+                for work in (1, 15, 60, 240):
+                    work_time = timedelta(minutes=work)
+                    result = timeline.cal_delay(task, None, work_time, prepared)
+                    self.assertEqual(result, linear_delay(expected, task.start_time, work_time, available))
+                    if delay is not None:
+                        self.assertEqual(result, delay)
+                    self.assertGreaterEqual(result, lower)
+                    if result == timedelta(0):
+                        self.assertTrue(zero)
+
+    @mock.patch.object(timeline, 'count_move_time', move_time)
+    @mock.patch.object(timeline, 'predict_batch', work_times)
+    def test_best_candidate_as_linear_scan(self):
+        rng = random.Random(4)
+        for _ in range(1000):
+            tugs = []
+            for k in range(rng.randint(1, 8)):
+                tug = SimpleNamespace(tug_id=k, pos=rng.randrange(N_PIERS), state=None, ts=None,
+                                      tasks=[], company=None, hp=rng.choice([1800, 2400, 3200]),
+                                      next_available_time=BASE + timedelta(minutes=rng.randrange(-300, 900)))
+                gtug = timeline.GTug(tug)
+                for _ in range(rng.choice([0, 0, 1, 3, 8])):
+                    gtug.timeline.insert(random_job(rng), gtug.next_available_time, gtug.pos)
+                tugs.append(gtug)
+            task = SimpleNamespace(start_time=random_job(rng)[0], start=rng.randrange(N_PIERS),
+                                   to=rng.randrange(N_PIERS))
+            size = rng.randint(1, 3)
+
+            def delay(task, cand):
+                return timeline.cal_delay(task, cand, work_times([task], [cand])[0])
+            best, delaytime = timeline.best_candidate(task, tugs, size)
+            expected, expected_delay = linear_best(task, [list(c) for c in combinations(tugs, size)], delay)
+            self.assertEqual(best, expected)
+            self.assertEqual(delaytime, expected_delay)
+
+
+if __name__ == '__main__':
+    unittest.main()
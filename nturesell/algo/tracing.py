@@ -0,0 +1,82 @@
+"""Streaming traces of simulations
+
+A trace keeps one record per handled event, so long simulations can be
+analysed offline without keeping the tasks and tugs in memory.
+"""
+
+import json
+from datetime import datetime
+
+
+def event_record(event, state=None, latency=None):
+    """Summarize a handled event
+
+    Args:
+        event (Event): the handled event
+        state (ExecState): what event.handle() returned
+        latency (float): seconds spent in the dispatching algorithm after the event, if called
+
+    Returns:
+        (dict): event type, task id, time, ids of the tugs of the task, state and latency
+    """
+    task = event.task
+    return {
+        'event': type(event).__name__,
+        'task': task.id if task is not None else None,
+        'time': event.time.isoformat(),
+        'tugs': [tug.tug_id for tug in task.tugs] if task is not None else [],
+        'state': state.name if state is not None else None,
+        'dispatch': latency,
+    }
+
+
+class TraceWriter():
+    """Append-only sink writing records as newline-delimited JSON
+
+    Args:
+        path (str): file to append to
+        flush_every (int): number of records buffered before flushing the file
+    """
+
+    def __init__(self, path, flush_every=1000):
+        self.path = path
+        self.flush_every = flush_every
+        self.n_records = 0
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, record):
+        self._file.write(json.dumps(record, default=str, ensure_ascii=False))
+        self._file.write('\n')
+        self.n_records += 1
+        if self.flush_every and self.n_records % self.flush_every == 0:
+            self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_trace(path, parse_dates=True):
+    """Read the records written by TraceWriter
+
+    Args:
+        path (str): the trace file
+        parse_dates (bool): convert times back to datetime
+
+    Yields:
+        (dict): a record
+    """
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if parse_dates and isinstance(record.get('time'), str):
+                record['time'] = datetime.fromisoformat(record['time'])
+            yield record
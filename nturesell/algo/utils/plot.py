@@ -1,56 +1,226 @@
+"""Gantt charts of tasks and tugs, drawn offline as SVG or HTML"""
+
+import json
+import os
+from collections import namedtuple
+from html import escape
+from itertools import islice
+
 import numpy as np
-import random
-import copy
-import plotly.tools as pt
-import plotly.plotly as pp
-import plotly.figure_factory as ff
-from datetime import datetime, timedelta
-from collections import deque
-# pt.set_credentials_file(username='hanjuTsai', api_key='XEOnjaC9Om7WcOwgbRqs')
-
-pt.set_credentials_file(username='angyeahyeah6',
-                        api_key='heDVJdzx2KYVJAfpReWi')
-
-number_of_colors = 100
-color = ["#"+''.join([random.choice('0123456789ABCDEF')
-                      for j in range(number_of_colors)]) for i in range(number_of_colors)]
-
-
-def ganttplot(tasks, tugs):
-    colors = dict()
-    for task in tasks:
-        #     color = "rgb({}, {}, {})".format(random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
-        color = 'rgb(128, 138, 135)'
-        colors[str(task.id)] = color
-    colors['delay_time'] = 'rgb(255,153,51)'
-    colors['move_time'] = 'rgb(0,204,204)'
-    colors['work_time'] = 'rgb(128, 138, 135)'
-
-    df = []
-    tasks.sort(key=lambda x: x.start_time_real)
-    for task in tasks:
-        df.append(dict(Task=str(task.id), Start=task.start_time_real,
-                       Finish=task.start_time_real + task.work_time, Resource=str(task.id)))
-        df.append(dict(Task=str(task.id), Start=task.start_time,
-                       Finish=task.start_time_real, Resource='delay_time'))
-
-    fig = ff.create_gantt(df, colors=colors, index_col='Resource',
-                          show_colorbar=True, group_tasks=True)
-    pp.plot(fig, filename='task-gantt', world_readable=True, auto_open=False)
-
-    df = []
+
+# intervals of a chart as arrays, one element per bar; a row of the chart per label
+Intervals = namedtuple("Intervals", ["label", "start", "finish", "resource"])
+
+COLORS = {
+    'delay_time': 'rgb(255,153,51)',
+    'move_time': 'rgb(0,204,204)',
+    'work_time': 'rgb(128, 138, 135)',
+}
+# working intervals of tasks have their ids as resources
+TASK_COLOR = COLORS['work_time']
+
+# steps of the time axis in minutes, the first giving at most MAX_TICKS ticks is used
+TICK_STEPS = [15, 30, 60, 120, 180, 360, 720, 1440, 2880, 10080]
+MAX_TICKS = 12
+
+WIDTH = 1000
+ROW_HEIGHT = 18
+LEFT = 60
+TOP = 40
+BOTTOM = 50
+
+
+def _times(values):
+    return np.array(values, dtype='datetime64[us]')
+
+
+def task_intervals(tasks):
+    """Working and delay intervals of tasks, sorted by actual starting time
+
+    Returns:
+        (Intervals): the working interval of each task followed by its delay
+    """
+    tasks = sorted(tasks, key=lambda x: x.start_time_real)
+    ids = np.array([str(task.id) for task in tasks], dtype=str)
+    real = _times([task.start_time_real for task in tasks])
+    start = _times([task.start_time for task in tasks])
+    work = np.array([task.work_time for task in tasks], dtype='timedelta64[us]')
+
+    return Intervals(
+        label=np.repeat(ids, 2),
+        start=np.column_stack((real, start)).ravel(),
+        finish=np.column_stack((real + work, real)).ravel(),
+        resource=np.column_stack((ids, np.full(len(ids), 'delay_time'))).ravel(),
+    )
+
+
+def tug_intervals(tugs):
+    """Moving and working intervals of tugs from their (move, start, end) time stamps
+
+    A task the tug is still working on, without its end, is left out.
+
+    Returns:
+        (Intervals): the moving interval of each job followed by its working
+    """
+    labels, stamps = [], []
     for tug in tugs:
-        ts = copy.copy(tug.ts)
-        while ts:
-            move = ts.popleft()
-            start = ts.popleft()
-            end = ts.popleft()
-            df.append(dict(Task=str(tug.tug_id), Start=move,
-                           Finish=start, Resource='move_time'))
-            df.append(dict(Task=str(tug.tug_id), Start=start,
-                           Finish=end, Resource='work_time'))
-            
-    
-    fig = ff.create_gantt(df, group_tasks=True, show_colorbar=True,
-                          colors=colors, index_col='Resource', showgrid_x=True)
-    pp.plot(fig, filename='tug-worktime-gantt', world_readable=True)
+        n = len(tug.ts) // 3
+        stamps.extend(islice(tug.ts, 3 * n))
+        labels.extend([str(tug.tug_id)] * n)
+    move, start, end = _times(stamps).reshape(-1, 3).T
+
+    return Intervals(
+        label=np.repeat(np.array(labels, dtype=str), 2),
+        start=np.column_stack((move, start)).ravel(),
+        finish=np.column_stack((start, end)).ravel(),
+        resource=np.tile(['move_time', 'work_time'], len(labels)),
+    )
+
+
+def records(intervals):
+    """Intervals as a list of dicts with keys Task, Start, Finish and Resource, times in ISO format
+    """
+    starts = np.datetime_as_string(intervals.start, unit='s')
+    finishes = np.datetime_as_string(intervals.finish, unit='s')
+    return [dict(Task=label, Start=start, Finish=finish, Resource=resource)
+            for label, start, finish, resource in zip(intervals.label.tolist(), starts.tolist(),
+                                                       finishes.tolist(), intervals.resource.tolist())]
+
+
+def gantt_data(tasks, tugs):
+    """Intervals of the Gantt charts of tasks and tugs with times in ISO format
+
+    Returns:
+        (dict): lists of dicts with keys Task, Start, Finish and Resource by 'tasks' and 'tugs'
+    """
+    return {'tasks': records(task_intervals(tasks)), 'tugs': records(tug_intervals(tugs))}
+
+
+def render_svg(intervals, title='', width=WIDTH, row_height=ROW_HEIGHT):
+    """Draw intervals as a Gantt chart
+
+    Args:
+        intervals (Intervals): the bars, a row for each label in order of appearance
+        title (str): title of the chart
+        width (int): width of the chart in pixels
+
+    Returns:
+        (str): the SVG document
+    """
+    labels, first, rows = np.unique(intervals.label, return_index=True, return_inverse=True)
+    # rows in order of the first appearance of labels
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    rows = rank[rows.ravel()]
+    labels = labels[order]
+
+    plot_width = width - LEFT - 20
+    height = TOP + len(labels) * row_height + BOTTOM
+    out = ['<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}" '
+           'font-family="sans-serif" font-size="11">'.format(width, height),
+           '<text x="{}" y="20" font-size="14">{}</text>'.format(LEFT, escape(title))]
+
+    if len(intervals.start):
+        t0 = intervals.start.min()
+        t1 = intervals.finish.max()
+        span = max((t1 - t0) / np.timedelta64(1, 's'), 60.0)
+        x = LEFT + (intervals.start - t0) / np.timedelta64(1, 's') / span * plot_width
+        w = np.maximum((intervals.finish - intervals.start) / np.timedelta64(1, 's'), 0) \
+            / span * plot_width
+        y = TOP + rows * row_height + 2
+        fills = [COLORS.get(resource, TASK_COLOR) for resource in intervals.resource.tolist()]
+        tips = records(intervals)
+        out.extend('<rect x="{:.1f}" y="{}" width="{:.1f}" height="{}" fill="{}">'
+                   '<title>{} {} {} - {}</title></rect>'.format(
+                       xi, yi, wi, row_height - 4, fill,
+                       escape(tip['Task']), escape(tip['Resource']), tip['Start'], tip['Finish'])
+                   for xi, yi, wi, fill, tip in zip(x.tolist(), y.tolist(), w.tolist(), fills, tips))
+        out.extend(_time_axis(t0, span, plot_width, TOP + len(labels) * row_height))
+
+    out.extend('<text x="{}" y="{}" text-anchor="end">{}</text>'.format(
+        LEFT - 6, TOP + i * row_height + row_height - 5, escape(label))
+        for i, label in enumerate(labels.tolist()))
+    out.extend(_legend(intervals.resource, height - 14))
+    out.append('</svg>')
+    return '\n'.join(out)
+
+
+def _time_axis(t0, span, plot_width, y):
+    step = next((s for s in TICK_STEPS if span / 60 / s <= MAX_TICKS), TICK_STEPS[-1])
+    step = np.timedelta64(step, 'm')
+    first = t0.astype('datetime64[m]')
+    first = first + (-first.astype(np.int64)) % step.astype(np.int64) * np.timedelta64(1, 'm')
+    ticks = np.arange(first, t0 + np.timedelta64(int(span), 's') + np.timedelta64(1, 's'), step)
+    xs = LEFT + (ticks - t0) / np.timedelta64(1, 's') / span * plot_width
+    labels = np.datetime_as_string(ticks, unit='m')
+
+    lines = ['<line x1="{}" y1="{}" x2="{}" y2="{}" stroke="black"/>'.format(
+        LEFT, y, LEFT + plot_width, y)]
+    for xi, label in zip(xs.tolist(), labels.tolist()):
+        lines.append('<line x1="{0:.1f}" y1="{1}" x2="{0:.1f}" y2="{2}" stroke="#ddd"/>'.format(
+            xi, TOP, y))
+        lines.append('<text x="{:.1f}" y="{}" text-anchor="middle">{}</text>'.format(
+            xi, y + 14, label.replace('T', ' ')))
+    return lines
+
+
+def _legend(resources, y):
+    names = np.unique(np.where(np.isin(resources, list(COLORS)), resources, 'work_time'))
+    items = []
+    for i, name in enumerate(names.tolist()):
+        x = LEFT + 110 * i
+        items.append('<rect x="{}" y="{}" width="10" height="10" fill="{}"/>'.format(
+            x, y - 9, COLORS[name]))
+        items.append('<text x="{}" y="{}">{}</text>'.format(x + 14, y, name))
+    return items
+
+
+def render_html(charts, title='Gantt charts'):
+    """Put SVG charts in an HTML page
+
+    Args:
+        charts ([str]): SVG documents from render_svg()
+
+    Returns:
+        (str): the HTML document
+    """
+    return '\n'.join(['<!DOCTYPE html>', '<html>', '<head><meta charset="utf-8">',
+                      '<title>{}</title></head>'.format(escape(title)), '<body>']
+                     + ['<div>{}</div>'.format(chart) for chart in charts]
+                     + ['</body>', '</html>'])
+
+
+def ganttplot(tasks, tugs, path='gantt.html'):
+    """Draw the Gantt charts of tasks and tugs
+
+    Args:
+        tasks ([Task]): tasks of a result
+        tugs ([Tug]): tugs of a result
+        path (str): file to write, by its extension
+            .html: a page of both charts
+            .svg: a file for each chart, named with -tasks and -tugs
+            .json: gantt_data()
+
+    Returns:
+        ([str]): paths of the written files
+    """
+    root, ext = os.path.splitext(path)
+    if ext == '.json':
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(gantt_data(tasks, tugs), f)
+        return [path]
+
+    charts = [render_svg(task_intervals(tasks), 'task-gantt'),
+              render_svg(tug_intervals(tugs), 'tug-worktime-gantt')]
+    if ext == '.svg':
+        paths = [root + '-tasks.svg', root + '-tugs.svg']
+        for p, chart in zip(paths, charts):
+            with open(p, 'w', encoding='utf-8') as f:
+                f.write(chart)
+        return paths
+    if ext == '.html':
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(render_html(charts))
+        return [path]
+    raise ValueError("Invalid path. Expected one of ['.html', '.svg', '.json'] as extension.")
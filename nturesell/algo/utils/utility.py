@@ -1,15 +1,108 @@
+import os
 import math
+import numpy as np
+from collections import namedtuple
 from datetime import datetime, timedelta
+from functools import lru_cache
 from random import randint
 from itertools import combinations
 from typing import List
 
 from ..model import TaskState, TugState, ShipState, ChargeTypeList, Tug, Task, Ship, ChargeType
-from ..port import get_pier_latlng
+from ..port import get_pier_latlng, pier_tables
 from ..settings import PENALTY, TUG_SPEED
 from .cutil import c_move_dis_to_time, c_count_dis
 from typing import Union
 
+TRAVEL_TABLE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data/travel_table.npz")
+
+TravelTable = namedtuple("TravelTable", ["dis", "time", "index", "latlng_index"])
+
+
+def _build_travel_table(path=TRAVEL_TABLE_FILE):
+    """Moving distances between all piers with coordinates, loaded from
+    path if it was built from the same piers and saved there otherwise
+
+    Returns:
+        (np.ndarray): (n, n) float64 distances in km indexed like pier_tables(),
+            NaN where a pier has no coordinate
+    """
+    t = pier_tables()
+    ids, pier_latlng = t.ids, t.latlng
+    try:
+        with np.load(path) as cache:
+            if np.array_equal(cache["ids"], ids) and \
+               np.array_equal(cache["latlng"], pier_latlng, equal_nan=True):
+                return cache["dis"]
+    except (OSError, KeyError, ValueError):
+        pass
+
+    dis = np.full((len(ids), len(ids)), np.nan)
+    latlng = pier_latlng.tolist()
+    known = np.flatnonzero(~np.isnan(pier_latlng[:, 0]))
+    for i in known:
+        for j in known:
+            # the same call as count_dis so both paths agree to the bit
+            dis[i, j] = c_count_dis(latlng[i][1], latlng[i][0], latlng[j][1], latlng[j][0])
+
+    try:
+        np.savez(path, ids=ids, latlng=pier_latlng, dis=dis)
+    except OSError:
+        pass
+    return dis
+
+
+@lru_cache(maxsize=None)
+def travel_table() -> TravelTable:
+    """Moving distances and times between all piers, built on first use
+
+    Returns:
+        (TravelTable): distances in km, times as timedelta (None if unknown),
+            pier number to row and coordinate given by get_pier_latlng to row
+    """
+    t = pier_tables()
+    index, pier_latlng = t.index, t.latlng
+    dis = _build_travel_table()
+    time = np.empty(dis.shape, dtype=object)
+    for (i, j), d in np.ndenumerate(dis):
+        if d == d: # not NaN
+            time[i, j] = timedelta(hours=c_move_dis_to_time(d, TUG_SPEED))
+
+    latlng_index = {(float(lat), float(lng)): i for i, (lat, lng) in enumerate(pier_latlng) if lat == lat}
+    return TravelTable(dis, time, index, latlng_index)
+
+
+def count_pier_move_dis(start, to):
+    """Calculate moving distance between two piers
+
+    Args:
+        start (int): pier number
+        to (int): pier number
+
+    Returns:
+        (float): distance in km
+    """
+    t = travel_table()
+    return float(t.dis[t.index[int(start)], t.index[int(to)]])
+
+
+def count_pier_move_time(start, to):
+    """Calculate moving time between two piers
+
+    Args:
+        start (int): pier number
+        to (int): pier number
+
+    Returns:
+        (timedelta): moving time
+    """
+    t = travel_table()
+    time = t.time[t.index[int(start)], t.index[int(to)]]
+    if time is None:
+        raise KeyError("No coordinate of pier {} or {}".format(start, to))
+    return time
+
+
 def count_move_dis(start, to):
     """Calculate moving distance from a coordinate to a pier
 
@@ -20,6 +113,12 @@ def count_move_dis(start, to):
     Returns:
         (float): distance in km
     """
+    t = travel_table()
+    i = t.latlng_index.get((float(start[0]), float(start[1])))
+    j = t.index.get(int(to))
+    if i is not None and j is not None and t.dis[i, j] == t.dis[i, j]:
+        return float(t.dis[i, j])
+
     dest = get_pier_latlng(to)
     dis = count_dis(float(start[0]), float(start[1]), float(dest[0]), float(dest[1]))
     return dis
@@ -41,6 +140,12 @@ def count_move_time(start, to, velo=TUG_SPEED):
     Returns:
         (timedelta): moving time
     """
+    t = travel_table()
+    i = t.latlng_index.get((float(start[0]), float(start[1])))
+    j = t.index.get(int(to))
+    if i is not None and j is not None and t.time[i, j] is not None:
+        return t.time[i, j]
+
     dis = count_move_dis(start, to)
     return move_dis_to_time(dis)
 
@@ -87,6 +192,12 @@ def get_oil_price(hp):
     return hp_price[hp]
 
 
+# revenue per hour ($/hour) of each charge type
+PRICES = {117: 7395, 118: 10846, 119: 19720, 120: 22310, 121: 32000}
+PRICE_ARRAY = np.zeros(max(PRICES) + 1)
+PRICE_ARRAY[list(PRICES)] = list(PRICES.values())
+
+
 def get_prices(req_types, tugs):
     """Convert types of tugs to revenue per hour according to comparison 
     between required types and dispatched tugs
@@ -100,7 +211,7 @@ def get_prices(req_types, tugs):
     """
 
     assert len(req_types) <= len(tugs)
-    table = {117: 7395, 118: 10846, 119: 19720, 120: 22310, 121: 32000}
+    table = PRICES
     req_types.sort()
     tugs.sort(key=lambda tug: tug.type)
     
@@ -144,3 +255,67 @@ def calculate_revenue(times: List[timedelta], req_types: List[ChargeType], tugs:
     return revenue
 
 
+class RevenueBatch():
+    """Collect charged tasks to calculate their revenue at once, each the
+    same as by calculate_revenue
+
+    The starting times of the tugs of all tasks are kept in one column with
+    the required types and the types of tugs, so the prices and the cycles
+    are calculated by arrays.
+    """
+
+    def __init__(self):
+        self.ends = []
+        self.starts = []
+        self.req_types = []
+        self.tug_types = []
+        self.counts = []
+
+    def add(self, end, times, req_types, tugs):
+        """Add a task charged from each time to end
+
+        Args:
+            end (datetime): the time the task ends
+            times ([datetime]): a list of timestamps when the tugs started moving
+            req_types ([ChargeType]): a list of required types for a task
+            tugs ([Tug]): a list of tugs assigned to a task
+
+        Return:
+            (int): index of the task in revenues()
+        """
+        if len(times) and len(req_types) and len(tugs):
+            assert len(times) == len(req_types) and len(times) == len(tugs), "Lists length differ"
+            self.starts.extend(times)
+            self.req_types.extend(req_types)
+            self.tug_types.extend(tug.type for tug in tugs)
+            self.counts.append(len(times))
+        else:
+            self.counts.append(0)
+        self.ends.append(end)
+        return len(self.counts) - 1
+
+    def revenues(self):
+        """
+        Return:
+            (numpy.ndarray): revenue of each added task
+        """
+        n = len(self.counts)
+        if not self.starts:
+            return np.zeros(n)
+        counts = np.array(self.counts)
+        tasks = np.repeat(np.arange(n), counts)
+        times = np.array(self.ends, dtype='datetime64[us]')[tasks] - \
+            np.array(self.starts, dtype='datetime64[us]')
+        req_types = np.array(self.req_types, dtype=np.int64)
+        tug_types = np.array(self.tug_types, dtype=np.int64)
+
+        # as get_prices, the types are sorted in each task but the times are not
+        req_types = req_types[np.lexsort((req_types, tasks))]
+        tug_types = tug_types[np.lexsort((tug_types, tasks))]
+        prices = PRICE_ARRAY[np.minimum(req_types, tug_types)]
+
+        # seconds of the times over an hour, wrapped in a day as timedelta.seconds
+        hour = np.timedelta64(60, 'm')
+        seconds = (times - hour).astype(np.int64) % (86400 * 10**6) // 10**6
+        cycles = np.where(times > hour, np.ceil(seconds / 60 / 30) * 0.5 + 1, 1)
+        return np.bincount(tasks, weights=prices * cycles, minlength=n)
@@ -48,6 +48,7 @@ INSTALLED_APPS = [
     'users',
     'channels',
     'chat',
+    'simulation',
 ]
 
 MIDDLEWARE = [
@@ -90,6 +91,12 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Processes running simulation jobs, see simulation/runner.py
+SIMULATION_WORKERS = 2
+# Results of simulations kept for repeated jobs
+SIMULATION_CACHE_SIZE = 64
+SIMULATION_CACHE_DIR = os.path.join(BASE_DIR, 'simulation_cache')
+
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
 
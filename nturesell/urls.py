@@ -32,6 +32,7 @@ urlpatterns = [
     path('register/', views.register),
     path('login/', views.login),
     path('event/',views.event),
+    path('simulation/', include('simulation.urls')),
     # path('event/', views.profile),
     # path('productdetail',views.productdetail),
     # path('editproduct',views.editproduct),
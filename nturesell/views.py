@@ -15,6 +15,10 @@ from typing import List
 from datetime import datetime
 from .algo.estimator import Estimator
 from .algo.model import Task, Tug
+from simulation import runner as simulation_runner
+
+# dispatching algorithms of the dashboard by algo_id
+ALGORITHMS = {"1": "cool_dispatch", "2": "timeline_dispatch"}
 
 def estimate_example(algo_id):
     """
@@ -68,8 +72,11 @@ def home(request):
         products2 = Product.objects.filter(information__icontains=productname)
         products = (list(set(chain(products1, products2))))
 
-    # elif 'start_dispatch' in request.POST:
-    #     estimate_example(algo_id)
+    elif 'start_dispatch' in request.POST:
+        # runs in the background, the page polls /simulation/<job.pk>/
+        # with a fixed seed, the same algorithm is simulated only once
+        job = simulation_runner.submit(request.user, ALGORITHMS[algo_id], seed=0)
+        products = Product.objects.filter(status=1)
 
     elif 'update' in request.POST:
         next_weight = random.randint(10000,100000)
@@ -0,0 +1,8 @@
+from django.contrib import admin
+from .models import SimulationJob
+
+
+@admin.register(SimulationJob)
+class SimulationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'owner', 'algorithm', 'status', 'progress', 'created', 'finished')
+    list_filter = ('status', 'algorithm')
@@ -0,0 +1,69 @@
+# simulation/consumers.py
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+import json
+
+from .models import SimulationJob
+
+
+def group_name(job_id):
+    return 'simulation_%d' % job_id
+
+
+class SimulationConsumer(AsyncWebsocketConsumer):
+    """Send the events of a simulation job to its owner as they are handled
+
+    Messages are JSON objects of one of the types:
+        events: {'type': 'events', 'records': [record], 'progress': float},
+            records as tracing.event_record()
+        status: {'type': 'status', 'job': SimulationJob.as_dict()}
+    """
+
+    async def connect(self):
+        self.job_id = int(self.scope['url_route']['kwargs']['job_id'])
+        self.group_name = group_name(self.job_id)
+
+        job = await self.get_job()
+        if job is None:
+            await self.close()
+            return
+
+        # Join job group
+        await self.channel_layer.group_add(
+            self.group_name,
+            self.channel_name
+        )
+        await self.accept()
+
+        # the job may have finished before connecting
+        if job['status'] in (SimulationJob.DONE, SimulationJob.FAILED):
+            await self.send(text_data=json.dumps({'type': 'status', 'job': job}))
+
+    async def disconnect(self, close_code):
+        # Leave job group
+        await self.channel_layer.group_discard(
+            self.group_name,
+            self.channel_name
+        )
+
+    @database_sync_to_async
+    def get_job(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            return None
+        job = SimulationJob.objects.filter(pk=self.job_id, owner=user).first()
+        return job.as_dict() if job else None
+
+    # Receive events from job group
+    async def simulation_events(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'events',
+            'records': event['records'],
+            'progress': event['progress'],
+        }))
+
+    async def simulation_status(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'status',
+            'job': event['job'],
+        }))
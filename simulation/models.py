@@ -0,0 +1,58 @@
+import json
+from django.db import models
+from django.conf import settings
+
+
+class SimulationJob(models.Model):
+    """A simulation of a dispatching algorithm run in the background
+
+    The result is the JSON of Estimator.summarize(), set when it is done.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='simulation_jobs',
+    )
+    algorithm = models.CharField(max_length=40)
+    row_start = models.IntegerField()
+    row_end = models.IntegerField()
+    seed = models.BigIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS, default=PENDING)
+    progress = models.FloatField(default=0)
+    result = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created']
+
+    def as_dict(self):
+        """The job as returned by the status endpoint"""
+        return {
+            'id': self.pk,
+            'algorithm': self.algorithm,
+            'row_start': self.row_start,
+            'row_end': self.row_end,
+            'seed': self.seed,
+            'status': self.status,
+            'progress': self.progress,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error or None,
+            'created': self.created.isoformat() if self.created else None,
+            'started': self.started.isoformat() if self.started else None,
+            'finished': self.finished.isoformat() if self.finished else None,
+        }
@@ -0,0 +1,7 @@
+from django.conf.urls import url
+
+from . import consumers
+
+websocket_urlpatterns = [
+    url(r'^ws/simulation/(?P<job_id>\d+)/$', consumers.SimulationConsumer),
+]
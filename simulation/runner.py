@@ -0,0 +1,262 @@
+"""Run simulation jobs in a local process pool
+
+Requests only create a SimulationJob and submit its id, so a worker of the
+web server is not blocked for the whole simulation. The worker process reads
+the job, runs Estimator.run and saves the progress and the result in the
+database, where the status endpoint polls them. The handled events are
+broadcast to SimulationConsumer through the channel layer as they come.
+
+Results are kept in a ResultStore shared by the processes, so a job with
+the inputs of an earlier one is done as soon as it is submitted.
+"""
+
+import json
+import logging
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from importlib import import_module
+from time import monotonic
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from nturesell.algo.result_store import ResultStore, result_key
+from .consumers import group_name
+from .models import SimulationJob
+
+logger = logging.getLogger(__name__)
+
+# dispatching algorithms which can be submitted, by name
+ALGORITHMS = {
+    'cool_dispatch': 'nturesell.algo.greedy.cool',
+    'timeline_dispatch': 'nturesell.algo.greedy.timeline',
+}
+
+_pool = None
+_store = None
+
+
+def _init_worker():
+    # spawned processes set up Django themselves
+    import django
+    django.setup()
+
+
+def get_pool():
+    """The process pool, started on first use
+
+    Processes are spawned rather than forked, because the server may have
+    threads and open connections which a forked child must not share.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(getattr(settings, 'SIMULATION_WORKERS', 2),
+                                    mp_context=multiprocessing.get_context('spawn'),
+                                    initializer=_init_worker)
+    return _pool
+
+
+def get_store():
+    """The store of the summaries of results, with their Gantt data
+    """
+    global _store
+    if _store is None:
+        _store = ResultStore(getattr(settings, 'SIMULATION_CACHE_SIZE', 64),
+                             getattr(settings, 'SIMULATION_CACHE_DIR', None))
+    return _store
+
+
+def load_algorithm(name):
+    if name not in ALGORITHMS:
+        raise ValueError("Invalid algorithm. Expected one of {}.".format(list(ALGORITHMS)))
+    return getattr(import_module(ALGORITHMS[name]), name)
+
+
+def submit(owner, algorithm, row_start=100, row_end=110, seed=None):
+    """Create a job and run it in the pool once the transaction commits
+
+    Args:
+        owner (User): who submits the job, or None
+        algorithm (str): a key of ALGORITHMS
+        row_start (int): starting row of the history data
+        row_end (int): ending row of the history data
+        seed (int): random seed of the simulation
+
+    Returns:
+        (SimulationJob): the pending job, or the done one if the result is stored
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError("Invalid algorithm. Expected one of {}.".format(list(ALGORITHMS)))
+    if row_end - row_start <= 0:
+        raise ValueError("Negative range")
+
+    summary = get_store().get(result_key(algorithm, row_start, row_end, seed))
+    if summary is not None:
+        now = timezone.now()
+        return SimulationJob.objects.create(owner=owner, algorithm=algorithm, row_start=row_start,
+                                            row_end=row_end, seed=seed, status=SimulationJob.DONE,
+                                            progress=1.0, result=json.dumps(summary),
+                                            started=now, finished=now)
+
+    job = SimulationJob.objects.create(owner=owner, algorithm=algorithm, row_start=row_start,
+                                       row_end=row_end, seed=seed)
+    transaction.on_commit(lambda: start_job(job.pk))
+    return job
+
+
+def start_job(job_id):
+    """Submit a job to the pool, marking it failed if the pool does not finish it
+    """
+    try:
+        future = get_pool().submit(run_job, job_id)
+    except Exception:
+        logger.exception("Submitting simulation job %d failed", job_id)
+        _reset_pool()
+        _mark_failed(job_id, traceback.format_exc())
+        return None
+    future.add_done_callback(partial(_job_done, job_id))
+    return future
+
+
+def _job_done(job_id, future):
+    # run_job saves its own errors, so only failures of the pool are left,
+    # e.g. a worker process died or could not set up Django
+    if future.cancelled():
+        _mark_failed(job_id, "Cancelled")
+        return
+    error = future.exception()
+    if error is None:
+        return
+    logger.error("Simulation job %d failed in the pool", job_id, exc_info=error)
+    if isinstance(error, BrokenProcessPool):
+        _reset_pool()
+    _mark_failed(job_id, ''.join(traceback.format_exception(type(error), error, error.__traceback__)))
+
+
+def _mark_failed(job_id, error):
+    # a job the worker finished keeps its status
+    unfinished = [SimulationJob.PENDING, SimulationJob.RUNNING]
+    try:
+        SimulationJob.objects.filter(pk=job_id, status__in=unfinished).update(
+            status=SimulationJob.FAILED, error=error, finished=timezone.now())
+    except Exception:
+        logger.exception("Marking simulation job %d failed did not succeed", job_id)
+
+
+def _reset_pool():
+    # a broken pool takes no more jobs, so the next submit starts a new one
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+
+class JobProgress():
+    """Trace sink saving the share of finished tasks of a job and broadcasting
+    the records to the job group of the channel layer
+
+    Records are sent in batches at most every interval seconds, so the
+    simulation does not wait on the channel layer for every event.
+
+    Args:
+        job_id (int): the job
+        estimator (Estimator): the estimator running the job, whose tasks are counted
+        interval (float): least seconds between two updates
+        channel_layer: the layer to broadcast to, None to only save the progress
+    """
+
+    def __init__(self, job_id, estimator, interval=0.5, channel_layer=None):
+        self.job_id = job_id
+        self.estimator = estimator
+        self.interval = interval
+        self.channel_layer = channel_layer
+        self.done = set()
+        self.records = []
+        self.saved = monotonic()
+
+    def write(self, record):
+        # temporary tasks have negative ids
+        if record['event'] in ('EndWork', 'Canceled') and record['task'] > 0:
+            self.done.add(record['task'])
+        if self.channel_layer is not None:
+            self.records.append(record)
+        if monotonic() - self.saved >= self.interval:
+            self.flush()
+
+    def flush(self):
+        self.saved = monotonic()
+        progress = self.progress
+        SimulationJob.objects.filter(pk=self.job_id).update(progress=progress)
+        if self.records:
+            records, self.records = self.records, []
+            self.send({'type': 'simulation.events', 'records': records, 'progress': progress})
+
+    def send(self, message):
+        if self.channel_layer is None:
+            return
+        try:
+            async_to_sync(self.channel_layer.group_send)(group_name(self.job_id), message)
+        except Exception:
+            # the simulation goes on without broadcasting
+            logger.warning("Broadcasting simulation job %d failed", self.job_id, exc_info=True)
+            self.channel_layer = None
+            self.records = []
+
+    @property
+    def progress(self):
+        n_tasks = len(getattr(self.estimator, 'tasks', []))
+        return min(len(self.done) / n_tasks, 1.0) if n_tasks else 0.0
+
+
+def run_job(job_id):
+    """Run a job in a worker process and save its result or error
+    """
+    from nturesell.algo.estimator import Estimator
+
+    job = None
+    trace = None
+    try:
+        job = SimulationJob.objects.get(pk=job_id)
+        job.status = SimulationJob.RUNNING
+        job.started = timezone.now()
+        job.save(update_fields=['status', 'started'])
+
+        est = Estimator()
+        trace = JobProgress(job.pk, est, channel_layer=get_channel_layer())
+        key = result_key(job.algorithm, job.row_start, job.row_end, job.seed)
+        # another job with the same inputs may have finished meanwhile
+        summary = get_store().get(key)
+        if summary is None:
+            est.set_range(job.row_start, job.row_end)
+            result = est.run(load_algorithm(job.algorithm), trace=trace, seed=job.seed)
+            summary = est.summarize(result, gantt=True)
+            get_store().put(key, summary)
+        job.result = json.dumps(summary)
+        job.progress = 1.0
+        job.status = SimulationJob.DONE
+    except Exception:
+        logger.exception("Simulation job %d failed", job_id)
+        if job is None:
+            _mark_failed(job_id, traceback.format_exc())
+        else:
+            job.error = traceback.format_exc()
+            if trace is not None:
+                job.progress = trace.progress
+            job.status = SimulationJob.FAILED
+    finally:
+        try:
+            if trace is not None:
+                trace.flush()
+            if job is not None:
+                job.finished = timezone.now()
+                job.save()
+                if trace is not None:
+                    trace.send({'type': 'simulation.status', 'job': job.as_dict()})
+        finally:
+            connections.close_all()
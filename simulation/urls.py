@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('', views.jobs, name='simulation_jobs'),
+    path('submit/', views.submit, name='simulation_submit'),
+    path('<int:job_id>/', views.status, name='simulation_status'),
+]
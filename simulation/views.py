@@ -0,0 +1,40 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_POST
+
+from . import runner
+from .models import SimulationJob
+
+
+@login_required
+@require_POST
+def submit(request):
+    """Submit a simulation, returns the pending job
+    """
+    try:
+        seed = request.POST.get('seed')
+        job = runner.submit(request.user,
+                            request.POST.get('algorithm', 'cool_dispatch'),
+                            int(request.POST.get('row_start', 100)),
+                            int(request.POST.get('row_end', 110)),
+                            int(seed) if seed else None)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(job.as_dict(), status=202)
+
+
+@login_required
+def status(request, job_id):
+    job = get_object_or_404(SimulationJob, pk=job_id, owner=request.user)
+    return JsonResponse(job.as_dict())
+
+
+@login_required
+def jobs(request):
+    """The latest jobs of the user, without their results
+    """
+    data = []
+    for job in SimulationJob.objects.filter(owner=request.user).defer('result')[:20]:
+        data.append({k: getattr(job, k) for k in ('id', 'algorithm', 'status', 'progress')})
+    return JsonResponse({'jobs': data})